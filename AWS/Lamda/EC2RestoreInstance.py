@@ -44,21 +44,33 @@ def create_volumes(snapshot_mappings, availability_zone):
 
 
 def swap_volumes(instance_id, old_volumes, new_volumes, reason):
-    for device, old_volume_id in old_volumes.items():
-        new_volume_id = new_volumes.get(device)
-        if new_volume_id:
-            ec2.detach_volume(VolumeId=old_volume_id, InstanceId=instance_id, Force=True)
-            ec2.get_waiter('volume_available').wait(VolumeIds=[old_volume_id])
-            
-            old_tags = ec2.describe_volumes(VolumeIds=[old_volume_id])['Volumes'][0]['Tags']
-            old_name = next((t['Value'] for t in old_tags if t['Key'] == 'Name'), 'instance_id')
-            ec2.create_tags(Resources=[old_volume_id], Tags=[{'Key': 'Name', 'Value': f"{old_name}_OLD_{reason}"}])
-            
-            ec2.attach_volume(VolumeId=new_volume_id, InstanceId=instance_id, Device=device)
-            ec2.get_waiter('volume_in_use').wait(VolumeIds=[new_volume_id])
-            
-            ec2.create_tags(Resources=[new_volume_id], Tags=old_tags)
-            ec2.create_tags(Resources=[new_volume_id], Tags=[{'Key': 'Name', 'Value': f"{old_name}_NEW_{reason}"}])
+    # The Lambda is deployed as a single file, so instead of AWS/python/ec2_waiter.py each step
+    # waits for all of its volumes with one waiter (one describe call per poll for all volume IDs)
+    swaps = {device: (old_volume_id, new_volumes[device]) for device, old_volume_id in old_volumes.items() if device in new_volumes}
+    if not swaps:
+        return
+    old_volume_ids = [old_volume_id for old_volume_id, _ in swaps.values()]
+    new_volume_ids = [new_volume_id for _, new_volume_id in swaps.values()]
+    old_tags = {v['VolumeId']: v.get('Tags', []) for v in ec2.describe_volumes(VolumeIds=old_volume_ids)['Volumes']}
+    old_names = {
+        volume_id: next((t['Value'] for t in tags if t['Key'] == 'Name'), 'instance_id')
+        for volume_id, tags in old_tags.items()
+    }
+
+    ec2.get_waiter('volume_available').wait(VolumeIds=new_volume_ids)
+    for old_volume_id in old_volume_ids:
+        ec2.detach_volume(VolumeId=old_volume_id, InstanceId=instance_id, Force=True)
+    ec2.get_waiter('volume_available').wait(VolumeIds=old_volume_ids)
+
+    for device, (old_volume_id, new_volume_id) in swaps.items():
+        ec2.create_tags(Resources=[old_volume_id], Tags=[{'Key': 'Name', 'Value': f"{old_names[old_volume_id]}_OLD_{reason}"}])
+        ec2.attach_volume(VolumeId=new_volume_id, InstanceId=instance_id, Device=device)
+    ec2.get_waiter('volume_in_use').wait(VolumeIds=new_volume_ids)
+
+    for device, (old_volume_id, new_volume_id) in swaps.items():
+        if old_tags[old_volume_id]:
+            ec2.create_tags(Resources=[new_volume_id], Tags=old_tags[old_volume_id])
+        ec2.create_tags(Resources=[new_volume_id], Tags=[{'Key': 'Name', 'Value': f"{old_names[old_volume_id]}_NEW_{reason}"}])
 
 
 def restore_instance(instance_id, ami_id, restore_all_disks, reason):
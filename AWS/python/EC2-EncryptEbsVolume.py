@@ -1,6 +1,12 @@
 import boto3
-import time
 import argparse
+from botocore.exceptions import ClientError
+from ec2_waiter import chunks, describe_resources, wait_for
+
+# Devices treated as the OS disk when the instance's root device name is unknown
+ROOT_DEVICE_NAMES = ('/dev/xvda', '/dev/sda1')
+# Snapshots of large volumes can take hours
+SNAPSHOT_TIMEOUT = 24 * 3600
 
 def init_aws_client(region):
     """Initializes EC2 boto client
@@ -22,32 +28,6 @@ def init_aws_client(region):
         print("Failed to create AWS client")
         exit(1)
 
-def create_snapshot(volume_id, ec2_client):
-    """Create a snapshot of the unencrypted volume and wait for it to become available."""
-    print(f"Creating snapshot for volume {volume_id}...")
-    response = ec2_client.create_snapshot(
-        VolumeId=volume_id,
-        Description=f"Snapshot for volume {volume_id} for encryption"
-    )
-    snapshot_id = response['SnapshotId']
-    print(f"Snapshot created: {snapshot_id}")
-    
-    # Wait for snapshot to be available
-    print(f"Waiting for snapshot {snapshot_id} to become available...")
-    wait_for_snapshot(snapshot_id, ec2_client)
-    print(f"Snapshot {snapshot_id} is now available.")
-    return snapshot_id
-
-def wait_for_snapshot(snapshot_id, ec2_client):
-    """Wait for the snapshot to be available."""
-    while True:
-        response = ec2_client.describe_snapshots(SnapshotIds=[snapshot_id])
-        snapshot_state = response['Snapshots'][0]['State']
-        if snapshot_state == 'completed':
-            break
-        print(f"Snapshot {snapshot_id} is in state {snapshot_state}. Waiting...")
-        time.sleep(10)
-
 def create_encrypted_volume_from_snapshot(snapshot_id, volume_type, iops, throughput, encryption_key_id, az, ec2_client):
     """Create an encrypted volume from the snapshot with the same specs as the original volume."""
     print(f"Creating encrypted volume from snapshot {snapshot_id} with type {volume_type}...")
@@ -59,8 +39,10 @@ def create_encrypted_volume_from_snapshot(snapshot_id, volume_type, iops, throug
     
     # For gp3 volumes, add IOPS and throughput if applicable
     if volume_type == 'gp3':
-        params['Iops'] = iops
-        params['Throughput'] = throughput
+        if iops:
+            params['Iops'] = iops
+        if throughput:
+            params['Throughput'] = throughput
     
     if encryption_key_id:
         params['KmsKeyId'] = encryption_key_id
@@ -77,90 +59,6 @@ def delete_snapshot(snapshot_id, ec2_client):
     ec2_client.delete_snapshot(SnapshotId=snapshot_id)
     print(f"Snapshot {snapshot_id} deleted.")
 
-def get_device_name_for_volume(volume_id, ec2_client):
-    """Get the device name for the attached volume."""
-    response = ec2_client.describe_volumes(VolumeIds=[volume_id])
-    volume = response['Volumes'][0]
-    
-    if 'Attachments' in volume and len(volume['Attachments']) > 0:
-        device_name = volume['Attachments'][0]['Device']
-        return device_name
-    else:
-        raise ValueError(f"Volume {volume_id} is not attached to any instance.")
-
-def get_volume_specs_and_tags(volume_id, ec2_client):
-    """Get the specifications of the volume (type, IOPS, throughput) and any tags."""
-    response = ec2_client.describe_volumes(VolumeIds=[volume_id])
-    volume = response['Volumes'][0]
-    
-    volume_type = volume['VolumeType']
-    iops = volume.get('Iops', None)
-    throughput = volume.get('Throughput', None)
-    az = volume['AvailabilityZone']
-    
-    # Retrieve the Name tag if it exists
-    name = None
-    if 'Tags' in volume:
-        for tag in volume['Tags']:
-            if tag['Key'] == 'Name':
-                name = tag['Value']
-                break
-    
-    return volume_type, iops, throughput, az, name
-
-def stop_instance(instance_id, ec2_client):
-    """Stop the EC2 instance."""
-    print(f"Stopping instance {instance_id}...")
-    ec2_client.stop_instances(InstanceIds=[instance_id])
-    print(f"Instance {instance_id} stopped.")
-    
-    # Wait until the instance is stopped
-    while True:
-        response = ec2_client.describe_instances(InstanceIds=[instance_id])
-        state = response['Reservations'][0]['Instances'][0]['State']['Name']
-        if state == 'stopped':
-            break
-        time.sleep(5)
-
-def start_instance(instance_id, ec2_client):
-    """Start the EC2 instance."""
-    print(f"Starting instance {instance_id}...")
-    ec2_client.start_instances(InstanceIds=[instance_id])
-    print(f"Instance {instance_id} started.")
-    
-    # Wait until the instance is running
-    while True:
-        response = ec2_client.describe_instances(InstanceIds=[instance_id])
-        state = response['Reservations'][0]['Instances'][0]['State']['Name']
-        if state == 'running':
-            break
-        time.sleep(5)
-
-def detach_and_attach_volumes(instance_id, original_volume_id, encrypted_volume_id, device_name, ec2_client):
-    """Detach the original volume and attach the encrypted volume to the instance."""
-    # Detach original volume
-    print(f"Detaching volume {original_volume_id} from instance {instance_id}...")
-    ec2_client.detach_volume(VolumeId=original_volume_id)
-    print(f"Volume {original_volume_id} detached.")
-    
-    # Wait until the volume is detached
-    print(f"Waiting for volume {original_volume_id} to be detached...")
-    while True:
-        response = ec2_client.describe_volumes(VolumeIds=[original_volume_id])
-        volume_state = response['Volumes'][0]['State']
-        if volume_state == 'available':
-            break
-        time.sleep(5)
-    
-    # Attach encrypted volume to the same device as the original
-    print(f"Attaching encrypted volume {encrypted_volume_id} to instance {instance_id} at device {device_name}...")
-    response = ec2_client.attach_volume(
-        VolumeId=encrypted_volume_id,
-        InstanceId=instance_id,
-        Device=device_name
-    )
-    print(f"Encrypted volume {encrypted_volume_id} attached at device {device_name}.")
-
 def rename_original_volume(volume_id, original_name, ec2_client):
     """Rename the original volume by appending '_Unencrypted'."""
     new_name = f"{original_name}_Unencrypted"
@@ -181,51 +79,216 @@ def rename_encrypted_volume(encrypted_volume_id, original_name, ec2_client):
         )
         print(f"Encrypted volume {encrypted_volume_id} renamed to {original_name}.")
 
-def encrypt_ebs_volume(volume_id, encryption_key_id, ec2_client):
-    """Main function to encrypt an EBS volume."""
-    # Create snapshot
-    snapshot_id = create_snapshot(volume_id, ec2_client)
-    
-    # Get the specifications of the original volume and its tags
-    volume_type, iops, throughput, az, original_name = get_volume_specs_and_tags(volume_id, ec2_client)
-    
-    # Create encrypted volume from snapshot with the same specs
-    encrypted_volume_id = create_encrypted_volume_from_snapshot(snapshot_id, volume_type, iops, throughput, encryption_key_id, az, ec2_client)
-    
-    # Delete the snapshot
-    delete_snapshot(snapshot_id, ec2_client)
-    
-    # Get the attachment details for the original volume
-    volume_info = ec2_client.describe_volumes(VolumeIds=[volume_id])['Volumes'][0]
-    
-    # If the volume is attached to an instance, get the device name
-    if volume_info['State'] == 'in-use':
-        instance_id = volume_info['Attachments'][0]['InstanceId']
-        device_name = get_device_name_for_volume(volume_id, ec2_client)
-        
-        # Handle instance stop/start if it's a root (OS) volume
-        if device_name == '/dev/xvda' or device_name == '/dev/sda1':
-            print(f"Volume {volume_id} is the OS disk. Stopping instance {instance_id}...")
-            stop_instance(instance_id, ec2_client)
-            detach_and_attach_volumes(instance_id, volume_id, encrypted_volume_id, device_name, ec2_client)
-            start_instance(instance_id, ec2_client)
-        else:
-            detach_and_attach_volumes(instance_id, volume_id, encrypted_volume_id, device_name, ec2_client)
-    
-    # Rename the original volume to include '_Unencrypted' and apply the same name to the encrypted volume
-    if original_name:
-        rename_original_volume(volume_id, original_name, ec2_client)
-        rename_encrypted_volume(encrypted_volume_id, original_name, ec2_client)
+def describe_volumes_batch(ec2_client, volume_ids=None, filters=None):
+    """Describe many volumes, by ID (in batches) or by filter (paginated)."""
+    if volume_ids:
+        return describe_resources(ec2_client, 'volume', volume_ids)
+    volumes = []
+    paginator = ec2_client.get_paginator('describe_volumes')
+    for page in paginator.paginate(Filters=filters or []):
+        volumes += page['Volumes']
+    return volumes
+
+def get_volume_name(volume):
+    """Get the Name tag of a described volume."""
+    for tag in volume.get('Tags', []):
+        if tag['Key'] == 'Name':
+            return tag['Value']
+    return None
+
+def start_snapshots(volume_ids, ec2_client):
+    """Start a snapshot of every volume and wait for all of them. Returns a dictionary of volume ID to snapshot ID (None when it failed)."""
+    snapshots = {}
+    for volume_id in volume_ids:
+        response = ec2_client.create_snapshot(
+            VolumeId=volume_id,
+            Description=f"Snapshot for volume {volume_id} for encryption"
+        )
+        snapshots[volume_id] = response['SnapshotId']
+        print(f"Snapshot {response['SnapshotId']} started for volume {volume_id}.")
+    failed = wait_for(ec2_client, 'snapshot', list(snapshots.values()), 'completed', timeout=SNAPSHOT_TIMEOUT)
+    return {volume_id: None if snapshot_id in failed else snapshot_id for volume_id, snapshot_id in snapshots.items()}
+
+def is_root_volume(volume, instance):
+    """Check whether the attached volume is the OS disk of the instance."""
+    root_devices = [instance['RootDeviceName']] if instance.get('RootDeviceName') else ROOT_DEVICE_NAMES
+    return volume['Attachments'][0]['Device'] in root_devices
+
+def create_encrypted_volumes(volumes, snapshots, encryption_key_id, ec2_client):
+    """
+    Create the encrypted volumes of the volumes from their snapshots and wait for them to be available.
+    Returns a dictionary of original volume ID to encrypted volume ID, volumes whose encrypted volume could not be
+    created are left out.
+    """
+    encrypted = {}
+    for volume in volumes:
+        try:
+            encrypted[volume['VolumeId']] = create_encrypted_volume_from_snapshot(
+                snapshots[volume['VolumeId']], volume['VolumeType'], volume.get('Iops'), volume.get('Throughput'),
+                encryption_key_id, volume['AvailabilityZone'], ec2_client
+            )
+        except ClientError as e:
+            print(f"Failed to create the encrypted volume of {volume['VolumeId']}: {e}")
+    failed = wait_for(ec2_client, 'volume', list(encrypted.values()), 'available')
+    return {volume_id: new_volume_id for volume_id, new_volume_id in encrypted.items() if new_volume_id not in failed}
+
+def restore_attachments(attached, detached, encrypted, stopped, ec2_client):
+    """
+    Attach the encrypted volume of every detached volume, or the original volume when there is no available encrypted
+    volume, and start the stopped instances. Every step is attempted, so one failure never leaves the other
+    instances stopped. Returns the IDs of the volumes whose attachment failed or could not be confirmed.
+    """
+    not_attached = []
+    attaching = []
+    for volume in attached:
+        if volume['VolumeId'] not in detached:
+            continue
+        attachment = volume['Attachments'][0]
+        new_volume_id = encrypted.get(volume['VolumeId'], volume['VolumeId'])
+        print(f"Attaching volume {new_volume_id} to instance {attachment['InstanceId']} at device {attachment['Device']}...")
+        try:
+            ec2_client.attach_volume(
+                VolumeId=new_volume_id,
+                InstanceId=attachment['InstanceId'],
+                Device=attachment['Device']
+            )
+            attaching.append(new_volume_id)
+        except ClientError as e:
+            print(f"Failed to attach volume {new_volume_id} to instance {attachment['InstanceId']}: {e}")
+            not_attached.append(new_volume_id)
+    try:
+        not_attached += sorted(wait_for(ec2_client, 'volume', attaching, 'in-use'))
+    except (ClientError, TimeoutError) as e:
+        print(f"Failed to confirm the volume attachments: {e}")
+        not_attached += attaching
+
+    if stopped:
+        print(f"Starting instances {', '.join(stopped)}...")
+        for batch in chunks(stopped):
+            try:
+                ec2_client.start_instances(InstanceIds=batch)
+            except ClientError as e:
+                print(f"Failed to start instances {', '.join(batch)}: {e}")
+        try:
+            wait_for(ec2_client, 'instance', stopped, 'running')
+        except (ClientError, TimeoutError) as e:
+            print(f"Failed to confirm that the instances are running: {e}")
+    return not_attached
+
+def encrypt_ebs_volumes(encryption_key_id, ec2_client, volume_ids=None, filters=None):
+    """
+    Encrypt EBS volumes. The volumes and their instances are described once, in batches.
+    Volumes attached to running instances get a pre-snapshot while the instance is still running. Only then the
+    instance is stopped (OS disks) or the volume is detached (other disks), and the cutover snapshot only captures
+    the blocks changed since the pre-snapshot, which keeps the downtime short even for large volumes.
+    The encrypted volumes of the other volumes (unattached, or attached to stopped instances) are created before
+    anything is stopped. Whatever fails during the cutover, the detached volumes get their original volume back
+    (unless their encrypted volume is available) and the stopped instances are started again.
+    All snapshots are tracked with one polling loop, every instance is stopped (and started) only once, and the
+    snapshots are only deleted once the instances are running again.
+
+    :param encryption_key_id: KMS key used for the encrypted volumes
+    :param ec2_client: EC2 client
+    :param volume_ids: IDs of the volumes to encrypt
+    :param filters: describe_volumes filters selecting the volumes to encrypt, used when no IDs are given
+    :return: Dictionary of original volume ID to encrypted volume ID
+    """
+    volumes = [v for v in describe_volumes_batch(ec2_client, volume_ids, filters) if not v['Encrypted']]
+    if not volumes:
+        print("No unencrypted volumes found.")
+        return {}
+    print(f"Encrypting {len(volumes)} volumes...")
+    failed = []
 
-    print(f"Encryption process complete for volume {volume_id}. Encrypted volume ID: {encrypted_volume_id}")
+    attached = [v for v in volumes if v['State'] == 'in-use']
+    instance_ids = sorted({v['Attachments'][0]['InstanceId'] for v in attached})
+    instances = {i['InstanceId']: i for i in describe_resources(ec2_client, 'instance', instance_ids)}
+    live = [v for v in attached if instances[v['Attachments'][0]['InstanceId']]['State']['Name'] != 'stopped']
+
+    # Snapshot every volume while the instances are still running
+    snapshots = start_snapshots([v['VolumeId'] for v in volumes], ec2_client)
+    taken = [snapshot_id for snapshot_id in snapshots.values() if snapshot_id]
+    failed += [v['VolumeId'] for v in volumes if not snapshots[v['VolumeId']]]
+    volumes = [v for v in volumes if snapshots[v['VolumeId']]]
+    attached = [v for v in attached if snapshots[v['VolumeId']]]
+    live = [v for v in live if snapshots[v['VolumeId']]]
+
+    # Volumes that are not in use keep their pre-snapshot, their encrypted volumes don't add to the downtime
+    live_ids = {v['VolumeId'] for v in live}
+    encrypted = create_encrypted_volumes([v for v in volumes if v['VolumeId'] not in live_ids], snapshots, encryption_key_id, ec2_client)
+
+    # Cutover: stop each instance whose OS disk is replaced once, and detach the volumes
+    to_stop = sorted({v['Attachments'][0]['InstanceId'] for v in live if is_root_volume(v, instances[v['Attachments'][0]['InstanceId']])})
+    stopped = []
+    detached = set()
+    not_attached = []
+    try:
+        if to_stop:
+            print(f"Stopping instances {', '.join(to_stop)}...")
+            for batch in chunks(to_stop):
+                ec2_client.stop_instances(InstanceIds=batch)
+                stopped += batch
+            wait_for(ec2_client, 'instance', to_stop, 'stopped')
+        for volume in attached:
+            print(f"Detaching volume {volume['VolumeId']} from instance {volume['Attachments'][0]['InstanceId']}...")
+            ec2_client.detach_volume(VolumeId=volume['VolumeId'], InstanceId=volume['Attachments'][0]['InstanceId'])
+            detached.add(volume['VolumeId'])
+        wait_for(ec2_client, 'volume', sorted(detached), 'available')
+
+        # The cutover snapshots only capture the changes since the pre-snapshots
+        if live:
+            print(f"Taking the cutover snapshots of {len(live)} volumes...")
+            cutover = start_snapshots([v['VolumeId'] for v in live], ec2_client)
+            taken += [snapshot_id for snapshot_id in cutover.values() if snapshot_id]
+            snapshots.update({volume_id: snapshot_id for volume_id, snapshot_id in cutover.items() if snapshot_id})
+            # Volumes with a failed cutover snapshot get their original volume back
+            encrypted.update(create_encrypted_volumes(
+                [v for v in live if cutover[v['VolumeId']]], snapshots, encryption_key_id, ec2_client
+            ))
+    finally:
+        not_attached = restore_attachments(attached, detached, encrypted, stopped, ec2_client)
+
+    failed += [v['VolumeId'] for v in volumes if v['VolumeId'] not in encrypted]
+    for snapshot_id in taken:
+        delete_snapshot(snapshot_id, ec2_client)
+
+    # Rename the original volumes to include '_Unencrypted' and apply the same name to the encrypted volumes
+    for volume in volumes:
+        original_name = get_volume_name(volume)
+        if original_name and volume['VolumeId'] in encrypted:
+            rename_original_volume(volume['VolumeId'], original_name, ec2_client)
+            rename_encrypted_volume(encrypted[volume['VolumeId']], original_name, ec2_client)
+
+    for volume_id, encrypted_volume_id in encrypted.items():
+        print(f"{volume_id} -> {encrypted_volume_id}")
+    if not_attached:
+        print(f"Volumes {', '.join(not_attached)} may not be attached, check their instances.")
+    if failed:
+        print(f"Failed to encrypt volumes {', '.join(failed)}.")
+    if failed or not_attached:
+        exit(1)
+    print(f"Encryption process complete for {len(encrypted)} volumes.")
+    return encrypted
+
+def parse_filter(value):
+    """Parse a Name=Value1,Value2 filter argument."""
+    name, sep, values = value.partition('=')
+    if not sep:
+        raise argparse.ArgumentTypeError(f"Invalid filter {value}, expected Name=Value1,Value2")
+    return {'Name': name, 'Values': values.split(',')}
 
 if __name__ == '__main__':
     parser = argparse.ArgumentParser()
     parser.add_argument(
         "--region", type=str, required=False, help="Region Name"
     )
-    parser.add_argument(
-        "--vol-id", type=str, required=True, help="Volume ID"
+    volumes_group = parser.add_mutually_exclusive_group(required=True)
+    volumes_group.add_argument(
+        "--vol-id", type=str, nargs="+", help="Volume ID(s)"
+    )
+    volumes_group.add_argument(
+        "--filter", type=parse_filter, action="append",
+        help="describe_volumes filter (Name=Value1,Value2) selecting the unencrypted volumes to encrypt. Can be repeated"
     )
     parser.add_argument(
         "--key-id", type=str, required=True, help="Encryption key ID to use for encryption"
@@ -234,7 +297,10 @@ if __name__ == '__main__':
     region = args.region
     ec2_client = init_aws_client(region)
 
-    volume_id = args.vol_id
     encryption_key_id = args.key_id
 
-    encrypt_ebs_volume(volume_id, encryption_key_id, ec2_client)
+    if args.filter:
+        filters = args.filter + [{'Name': 'encrypted', 'Values': ['false']}]
+        encrypt_ebs_volumes(encryption_key_id, ec2_client, filters=filters)
+    else:
+        encrypt_ebs_volumes(encryption_key_id, ec2_client, volume_ids=args.vol_id)
@@ -1,6 +1,7 @@
 import boto3
 from botocore.exceptions import ClientError
 import argparse
+from ec2_waiter import chunks, describe_resources, wait_for
 
 
 def init_aws_client(region):
@@ -58,36 +59,68 @@ def get_instance_name(instance_id, ec2_client):
         return "Unknown Name"
 
 
-def stop_instance(instance_id, ec2_client):
+def call_in_batches(operation, instance_ids, action):
     """
-    Stop the EC2 instance and wait for the instance to stop
+    Call stop_instances or start_instances in batches. A batch that fails (e.g. because of one bad or busy
+    instance) is retried instance by instance, so the other instances of the batch are not skipped.
+    Returns the IDs the call succeeded for.
     """
-    try:
-        instance_name = get_instance_name(instance_id, ec2_client)
-        print(f"Stopping instance: {instance_id} ({instance_name})")
-        ec2_client.stop_instances(InstanceIds=[instance_id])
-        # Wait until the instance is stopped
-        waiter = ec2_client.get_waiter("instance_stopped")
-        waiter.wait(InstanceIds=[instance_id])
-        print(f"Instance {instance_id} ({instance_name}) has stopped.")
-    except ClientError as e:
-        print(f"Error stopping instance {instance_id} ({instance_name}): {e}")
+    done = []
+    for batch in chunks(instance_ids):
+        try:
+            operation(InstanceIds=batch)
+            done += batch
+        except ClientError as e:
+            print(f"Error trying to {action} instances {', '.join(batch)}: {e}. Retrying one by one...")
+            for instance_id in batch:
+                try:
+                    operation(InstanceIds=[instance_id])
+                    done.append(instance_id)
+                except ClientError as e:
+                    print(f"Error trying to {action} instance {instance_id}: {e}")
+    return done
+
+
+def stop_instances(instance_ids, ec2_client):
+    """
+    Stop the EC2 instances. Returns the IDs of the instances that are stopping.
+    """
+    print(f"Stopping instances: {', '.join(instance_ids)}")
+    return call_in_batches(ec2_client.stop_instances, instance_ids, "stop")
 
 
-def start_instance(instance_id, ec2_client):
+def wait_for_stopped(instance_ids, ec2_client):
     """
-    Start the EC2 instance and wait for the instance to start
+    Wait for the EC2 instances to stop. Returns the IDs of the instances that stopped, an instance that is stuck
+    does not hold back the others.
     """
     try:
-        instance_name = get_instance_name(instance_id, ec2_client)
-        print(f"Starting instance: {instance_id} ({instance_name})")
-        ec2_client.start_instances(InstanceIds=[instance_id])
-        # Wait until the instance is running
-        waiter = ec2_client.get_waiter("instance_running")
-        waiter.wait(InstanceIds=[instance_id])
-        print(f"Instance {instance_id} ({instance_name}) is now running.")
-    except ClientError as e:
-        print(f"Error starting instance {instance_id} ({instance_name}): {e}")
+        wait_for(ec2_client, "instance", instance_ids, "stopped")
+    except (ClientError, TimeoutError) as e:
+        print(f"Error waiting for instances to stop: {e}")
+    states = {
+        instance["InstanceId"]: instance["State"]["Name"]
+        for instance in describe_resources(ec2_client, "instance", instance_ids)
+    }
+    stopped = [instance_id for instance_id in instance_ids if states.get(instance_id) == "stopped"]
+    print(f"Instances {', '.join(stopped) or '-'} have stopped.")
+    return stopped
+
+
+def start_instances(instance_ids, ec2_client):
+    """
+    Start the EC2 instances and wait for all of them to run
+    """
+    print(f"Starting instances: {', '.join(instance_ids)}")
+    started = call_in_batches(ec2_client.start_instances, instance_ids, "start")
+    try:
+        wait_for(ec2_client, "instance", started, "running")
+        print(f"Instances {', '.join(started)} are now running.")
+    except (ClientError, TimeoutError) as e:
+        print(f"Error waiting for instances to start: {e}")
+    not_started = [instance_id for instance_id in instance_ids if instance_id not in started]
+    if not_started:
+        print(f"Instances {', '.join(not_started)} could not be started, start them manually.")
 
 
 def modify_user_data(instance_id, ec2_client):
@@ -129,6 +162,8 @@ def process_instances(ec2_client):
     Process each EC2 instance
     """
     instances = get_instances(ec2_client)
+    # Running instances are stopped, modified and started together once all of them are confirmed
+    to_restart = []
 
     for instance in instances:
         instance_id = instance["InstanceId"]
@@ -154,9 +189,7 @@ def process_instances(ec2_client):
                 f"Instance {instance_id} ({instance_name}) is running. Do you want to stop it, modify user data, and restart it? (y/n): "
             )
             if user_input.lower() == "y":
-                stop_instance(instance_id, ec2_client)
-                modify_user_data(instance_id, ec2_client)
-                start_instance(instance_id, ec2_client)
+                to_restart.append(instance_id)
             else:
                 print(
                     f"Skipping modification for running instance {instance_id} ({instance_name})."
@@ -166,6 +199,16 @@ def process_instances(ec2_client):
                 f"Instance {instance_id} ({instance_name}) is in an unsupported state: {state}. Skipping."
             )
 
+    if to_restart:
+        stopping = stop_instances(to_restart, ec2_client)
+        try:
+            for instance_id in wait_for_stopped(stopping, ec2_client):
+                modify_user_data(instance_id, ec2_client)
+        finally:
+            # Every instance that was stopped is started again, whatever failed in between
+            if stopping:
+                start_instances(stopping, ec2_client)
+
 
 if __name__ == "__main__":
     parser = argparse.ArgumentParser()
@@ -1,10 +1,24 @@
 # On the source account/region execute:
-# nohup python EC2-ShareAmiWithAccount.py --region currentRegion --ami-id sourceAMI --key-id <kmsID|create> --account-id targetAccountID >> ./ShareAmiWithAccount.log &
+# nohup python EC2-ShareAmiWithAccount.py --region currentRegion --ami-id sourceAMI [sourceAMI ...] --key-id <kmsID|create> --account-id targetAccountID [targetAccountID ...] >> ./ShareAmiWithAccount.log &
+# To replicate to other regions, add the destinations with their KMS keys (or 'create') and a manifest file for the resulting AMI IDs:
+# ... --dest-region us-west-2 eu-west-1 --region-key us-west-2=<kmsID|create> --region-key eu-west-1=<kmsID|create> --manifest ./amis.json
 
 import boto3
 from botocore.exceptions import ClientError
 import argparse
 import json
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timezone
+from ec2_waiter import PendingResources, describe_resources
+
+# Default number of AMI copies in progress at the same time (AWS limits the concurrent copies per destination region)
+MAX_CONCURRENT_COPIES = 20
+# Copies of large AMIs can take hours
+COPY_TIMEOUT = 12 * 3600
+# Default number of destination regions replicated at the same time
+MAX_CONCURRENT_REGIONS = 4
 
 
 def init_aws_clients(region):
@@ -43,7 +57,7 @@ def create_kms_key(kms_client):
         key_id = response['KeyMetadata']['KeyId']
         print(f"Succcesfully created KMS with ID: {key_id}")
 
-        key_alias = 'Protera-Shared-Key'
+        key_alias = 'alias/Protera-Shared-Key'
         kms_client.create_alias(
             AliasName=key_alias,
             TargetKeyId=key_id
@@ -56,7 +70,7 @@ def create_kms_key(kms_client):
         exit(1)
 
 
-def share_kms_with_account(key_id, account_id, kms_client):
+def share_kms_with_accounts(key_id, account_ids, kms_client):
     try:
         # Get the current key policy
         response = kms_client.get_key_policy(
@@ -75,37 +89,50 @@ def share_kms_with_account(key_id, account_id, kms_client):
 
         current_policy = json.loads(response['Policy'])
 
-        account_arn = f"arn:aws:iam::{account_id}:root"
-
-        # Check if the permission already exists
-        statement_exists = False
-        for stmt in current_policy.get('Statement', []):
-            principals = stmt.get('Principal', {}).get('AWS', [])
-            if isinstance(principals, str):
-                principals = [principals]
-
-            if account_arn in principals:
-                existing_actions = set(stmt.get('Action', []))
-                if isinstance(stmt.get('Action'), str):
-                    existing_actions = {stmt['Action']}
-
-                if desired_actions.issubset(existing_actions):
-                    statement_exists = True
-                    break
-
-        # If the statement doesn't exist, append it
-        if not statement_exists:
-            new_statement = {
-                "Sid": "AllowExternalAccountUse",
-                "Effect": "Allow",
-                "Principal": {
-                    "AWS": account_arn
-                },
-                "Action": sorted(desired_actions),
-                "Resource": "*"
-            }
-
-            current_policy['Statement'].append(new_statement)
+        # Find the accounts the policy already allows
+        missing_arns = []
+        for account_id in account_ids:
+            account_arn = f"arn:aws:iam::{account_id}:root"
+            statement_exists = False
+            for stmt in current_policy.get('Statement', []):
+                principals = stmt.get('Principal', {}).get('AWS', [])
+                if isinstance(principals, str):
+                    principals = [principals]
+
+                if account_arn in principals:
+                    existing_actions = set(stmt.get('Action', []))
+                    if isinstance(stmt.get('Action'), str):
+                        existing_actions = {stmt['Action']}
+
+                    if desired_actions.issubset(existing_actions):
+                        statement_exists = True
+                        break
+            if statement_exists:
+                print("KMS key policy already allows access for account:", account_id)
+            else:
+                missing_arns.append(account_arn)
+
+        # Add all the missing accounts with a single policy update, to the statement of a previous run if there is one
+        if missing_arns:
+            statement = next((stmt for stmt in current_policy['Statement'] if stmt.get('Sid') == "AllowExternalAccountUse"), None)
+            if statement:
+                principals = statement['Principal']['AWS']
+                if isinstance(principals, str):
+                    principals = [principals]
+                statement['Principal']['AWS'] = principals + missing_arns
+                statement['Action'] = sorted(desired_actions)
+            else:
+                new_statement = {
+                    "Sid": "AllowExternalAccountUse",
+                    "Effect": "Allow",
+                    "Principal": {
+                        "AWS": missing_arns[0] if len(missing_arns) == 1 else missing_arns
+                    },
+                    "Action": sorted(desired_actions),
+                    "Resource": "*"
+                }
+
+                current_policy['Statement'].append(new_statement)
 
             # Update the key policy
             kms_client.put_key_policy(
@@ -113,73 +140,145 @@ def share_kms_with_account(key_id, account_id, kms_client):
                 Policy=json.dumps(current_policy),
                 PolicyName='default'
             )
-            print("KMS key policy updated to allow access for account:", account_id)
-        else:
-            print("KMS key policy already allows access for account:", account_id)
+            print("KMS key policy updated to allow access for accounts:", ", ".join(arn.split(':')[4] for arn in missing_arns))
 
     except Exception as e:
-        print("Failed to share KMS key with external account")
+        print("Failed to share KMS key with external accounts")
         exit(1)
 
-def copy_ami_with_new_encryption(region, ami_id, key_id, ec2_client):  
-    try:
-        # Describe the existing AMI to get its details
-        response = ec2_client.describe_images(ImageIds=[ami_id])
-        ami = response['Images'][0]
-        
-        old_ami_name = ami['Name']
-        print(f"Source AMI found: {ami_id} ({old_ami_name})...")
-        
-        # Define new AMI name
-        new_ami_name = f"{old_ami_name}_Shared"
-        
-        # Initiate the copy of the AMI with a new KMS encryption key
-        print(f"Copying AMI '{ami_id}' to a new AMI named {new_ami_name}")
-        copy_response = ec2_client.copy_image(
-            Name=new_ami_name,
-            SourceImageId=ami_id,
-            SourceRegion=region,
-            Encrypted=True,
-            KmsKeyId=key_id
-        )
-        
-        new_ami_id = copy_response['ImageId']
-        print(f"Copy initiated. New AMI ID: {new_ami_id}")
-
-        # Wait for the AMI to become available
-        print(f"Waiting for the new AMI {new_ami_id} to become available...")
-        
-        waiter = ec2_client.get_waiter('image_available')
-        waiter.wait(
-            ImageIds=[new_ami_id],
-            WaiterConfig={
-                'Delay': 120,
-                'MaxAttempts': 120
-            }
-        )
-        print(f"New AMI {new_ami_id} is now available")
+def start_ami_copy(region, ami, key_id, ec2_client):
+    """Start the copy of the AMI (from region to the region of ec2_client) with the new KMS encryption key, without waiting for it."""
+    # Define new AMI name
+    new_ami_name = f"{ami['Name']}_Shared"
+
+    print(f"Copying AMI '{ami['ImageId']}' to a new AMI named {new_ami_name} in {ec2_client.meta.region_name}")
+    copy_response = ec2_client.copy_image(
+        Name=new_ami_name,
+        SourceImageId=ami['ImageId'],
+        SourceRegion=region,
+        Encrypted=True,
+        KmsKeyId=key_id
+    )
+    new_ami_id = copy_response['ImageId']
+    print(f"Copy initiated. New AMI ID: {new_ami_id} ({ec2_client.meta.region_name})")
+    return new_ami_id
 
+def describe_source_amis(ami_ids, ec2_client):
+    """Describe the AMIs to share, all at once."""
+    try:
+        sources = describe_resources(ec2_client, 'image', ami_ids)
     except ClientError as e:
         print(f"Error: {e}")
-        return None
-
-    return new_ami_id
+        exit(1)
+    for ami in sources:
+        print(f"Source AMI found: {ami['ImageId']} ({ami['Name']})...")
+    return sources
 
-def share_ami(ami_id, account_id, ec2_client):
+def copy_and_share_amis(region, sources, key_id, account_ids, ec2_client, max_copies=MAX_CONCURRENT_COPIES):
+    """
+    Copy the AMIs from region to the region of ec2_client with the new encryption key and share the copies with the accounts.
+    Up to max_copies copies run at the same time, all of them are tracked by one polling loop,
+    and each copy is shared as soon as it becomes available (which also frees its slot for the next copy).
+
+    :param region: AWS Region of the source AMIs
+    :param sources: Described source AMIs
+    :param key_id: KMS key of the copies, in the destination region
+    :param account_ids: IDs of the accounts to share the copies with
+    :param ec2_client: EC2 client of the destination region
+    :param max_copies: Maximum number of copies in progress
+    :return: Dictionary of source AMI ID to shared AMI ID (None when it failed)
+    """
+    dest_region = ec2_client.meta.region_name
+    queue = deque(sources)
+    copies = {}
+    results = {ami['ImageId']: None for ami in sources}
+
+    def share_copy(image):
+        source_id = copies[image['ImageId']]
+        print(f"New AMI {image['ImageId']} is now available in {dest_region}")
+        if share_ami(image['ImageId'], account_ids, ec2_client):
+            results[source_id] = image['ImageId']
+            print(f"{dest_region}: {sum(1 for new_ami_id in results.values() if new_ami_id)}/{len(results)} AMIs shared")
+
+    pending = PendingResources(ec2_client, 'image', [], 'available', COPY_TIMEOUT, 15, 60, share_copy)
+    while queue or pending.pending:
+        # Start copies until the limit is reached
+        while queue and len(pending.pending) < max_copies:
+            ami = queue[0]
+            try:
+                new_ami_id = start_ami_copy(region, ami, key_id, ec2_client)
+            except ClientError as e:
+                if e.response['Error']['Code'] == 'ResourceLimitExceeded' and pending.pending:
+                    print(f"Concurrent copy limit reached in {dest_region}, {len(queue)} AMIs queued.")
+                    break
+                print(f"Error copying AMI {ami['ImageId']}: {e}")
+                queue.popleft()
+                continue
+            queue.popleft()
+            copies[new_ami_id] = ami['ImageId']
+            pending.add([new_ami_id])
+        if pending.pending and not pending.poll():
+            time.sleep(pending.next_delay())
+    for new_ami_id in pending.failed:
+        print(f"Copy {new_ami_id} of AMI {copies[new_ami_id]} to {dest_region} failed.")
+    return results
+
+def replicate_amis(region, sources, region_keys, account_ids, max_copies=MAX_CONCURRENT_COPIES, max_regions=MAX_CONCURRENT_REGIONS):
+    """
+    Fan the AMIs out to the destination regions in parallel, at most max_regions regions at a time.
+    Each destination gets its own KMS key (already shared with the accounts) and its own copy limit.
+
+    :param region: AWS Region of the source AMIs
+    :param sources: Described source AMIs
+    :param region_keys: Dictionary of destination region to (KMS key ID, EC2 client)
+    :param account_ids: IDs of the accounts to share the copies with
+    :param max_copies: Maximum number of copies in progress per destination region
+    :param max_regions: Maximum number of destination regions replicated at the same time
+    :return: Dictionary of destination region to {source AMI ID: shared AMI ID (None when it failed)}
+    """
+    with ThreadPoolExecutor(max_workers=max_regions) as executor:
+        futures = {
+            dest_region: executor.submit(copy_and_share_amis, region, sources, key_id, account_ids, dest_client, max_copies)
+            for dest_region, (key_id, dest_client) in region_keys.items()
+        }
+        results = {}
+        for dest_region, future in futures.items():
+            try:
+                results[dest_region] = future.result()
+            except Exception as e:
+                print(f"Replication to {dest_region} failed: {e}")
+                results[dest_region] = {ami['ImageId']: None for ami in sources}
+            done = sum(1 for new_ami_id in results[dest_region].values() if new_ami_id)
+            print(f"{dest_region}: {done}/{len(sources)} AMIs copied and shared")
+    return results
+
+def write_manifest(manifest_file, region, results):
+    """Write the resulting AMI IDs per destination region, for launch templates and other tooling to consume."""
+    manifest = {
+        "source_region": region,
+        "created": datetime.now(timezone.utc).strftime("%Y-%m-%dT%H:%M:%SZ"),
+        "regions": results,
+    }
+    with open(manifest_file, "w") as f:
+        json.dump(manifest, f, indent=2)
+    print(f"Manifest written to {manifest_file}")
+
+def share_ami(ami_id, account_ids, ec2_client):
     try:
         ec2_client.modify_image_attribute(
             ImageId=ami_id,
             LaunchPermission={
                 'Add': [
-                    {'UserId': account_id}
+                    {'UserId': account_id} for account_id in account_ids
                 ]
             }
         )
-        print(f"New AMI {ami_id} shared successfully with account {account_id}")
+        print(f"New AMI {ami_id} shared successfully with accounts {', '.join(account_ids)}")
+        return True
 
     except Exception as e:
-        print(f"Failed to share AMI {ami_id} with external account")
-        exit(1)
+        print(f"Failed to share AMI {ami_id} with external accounts: {e}")
+        return False
     
 if __name__ == "__main__":
     parser = argparse.ArgumentParser()
@@ -187,31 +286,70 @@ if __name__ == "__main__":
         "--region", type=str, required=True, help="Region Name"
     )
     parser.add_argument(
-        "--ami-id", type=str, required=True, help="AMI ID to share"
+        "--ami-id", type=str, nargs="+", required=True, help="AMI ID(s) to share"
     )
     parser.add_argument(
         "--key-id", type=str, required=True, help="Encryption key used for sharing"
     )
     parser.add_argument(
-        "--account-id", type=str, required=True, help="Account ID to share the AMI with"
+        "--account-id", type=str, nargs="+", required=True, help="Account ID(s) to share the AMIs with"
+    )
+    parser.add_argument(
+        "--max-copies", type=int, default=MAX_CONCURRENT_COPIES, help=f"Maximum number of AMI copies in progress at the same time, per destination region (default {MAX_CONCURRENT_COPIES})"
+    )
+    parser.add_argument(
+        "--dest-region", type=str, nargs="+", help="Region(s) to copy the AMIs to (default: the source region)"
+    )
+    parser.add_argument(
+        "--region-key", type=str, action="append", default=[], help="REGION=KEY encryption key (or 'create') of a destination region, --key-id is used for the source region. Can be repeated"
+    )
+    parser.add_argument(
+        "--max-regions", type=int, default=MAX_CONCURRENT_REGIONS, help=f"Maximum number of destination regions replicated at the same time (default {MAX_CONCURRENT_REGIONS})"
+    )
+    parser.add_argument(
+        "--manifest", type=str, help="JSON file to write the resulting AMI IDs per region to"
     )
     args = parser.parse_args()
     region = args.region
-    ami_id = args.ami_id
+    ami_ids = args.ami_id
     key_id = args.key_id
-    account_id = args.account_id
+    account_ids = args.account_id
+
+    # KMS key of every destination region
+    key_map = {region: key_id}
+    for region_key in args.region_key:
+        dest_region, sep, dest_key = region_key.partition('=')
+        if not sep or not dest_key:
+            print(f"Invalid --region-key {region_key}, expected REGION=KEY. Exiting...")
+            exit(1)
+        key_map[dest_region] = dest_key
+    dest_regions = args.dest_region or [region]
+    missing_keys = [dest_region for dest_region in dest_regions if dest_region not in key_map]
+    if missing_keys:
+        print(f"No encryption key given for {', '.join(missing_keys)}, use --region-key REGION=<kmsID|create>. Exiting...")
+        exit(1)
 
     ec2_client, kms_client = init_aws_clients(region)
-    
-    if key_id == 'create':
-        key_id = create_kms_key(kms_client)
-
-    share_kms_with_account(key_id, account_id, kms_client)
-
-    new_ami_id = copy_ami_with_new_encryption(region, ami_id, key_id, ec2_client)
-
-    if new_ami_id:
-        share_ami(new_ami_id, account_id, ec2_client)
-    else:
-        print("Failed to create the new AMI.")
+    sources = describe_source_amis(ami_ids, ec2_client)
+
+    # Prepare the KMS key of each destination once, before any copy starts
+    region_keys = {}
+    for dest_region in dest_regions:
+        dest_client, dest_kms_client = (ec2_client, kms_client) if dest_region == region else init_aws_clients(dest_region)
+        dest_key = key_map[dest_region]
+        if dest_key == 'create':
+            dest_key = create_kms_key(dest_kms_client)
+        share_kms_with_accounts(dest_key, account_ids, dest_kms_client)
+        region_keys[dest_region] = (dest_key, dest_client)
+
+    results = replicate_amis(region, sources, region_keys, account_ids, args.max_copies, args.max_regions)
+
+    for dest_region, region_results in results.items():
+        for ami_id, new_ami_id in region_results.items():
+            print(f"{dest_region}: {ami_id} -> {new_ami_id or 'FAILED'}")
+    if args.manifest:
+        write_manifest(args.manifest, region, results)
+    if not all(new_ami_id for region_results in results.values() for new_ami_id in region_results.values()):
+        print("Failed to create or share some of the new AMIs.")
+        exit(1)
 
@@ -1,12 +1,40 @@
 import boto3
+from botocore.config import Config
+from botocore.exceptions import ClientError
+import argparse
 import datetime
 import time
+from concurrent.futures import ThreadPoolExecutor
+from ec2_waiter import wait_for
 
-def delete_old_amis():
-    ec2_client = boto3.client('ec2')
+# Default number of concurrent deregister/delete calls
+MAX_WORKERS = 10
+# Throttled calls are retried by botocore's adaptive mode, which also rate limits the client
+RETRY_CONFIG = Config(retries={'max_attempts': 10, 'mode': 'adaptive'})
+# A snapshot can still be reported in use for a short while after its AMI is deregistered
+SNAPSHOT_IN_USE_RETRIES = 5
+# Unreferenced snapshots younger than this are never reported, they may belong to a job that is still running
+RECONCILE_MIN_AGE_DAYS = 30
+# Snapshots with tags starting with this prefix are managed by AWS Backup or Data Lifecycle Manager retention
+MANAGED_TAG_PREFIX = 'aws:'
 
-    # Get all AMIs owned by the account
-    response = ec2_client.describe_images(
+def init_aws_client(region):
+    """Initializes EC2 boto client with throttling-aware retries"""
+    try:
+        if region:
+            return boto3.client('ec2', region_name=region, config=RETRY_CONFIG)
+        return boto3.client('ec2', config=RETRY_CONFIG)
+    except Exception as e:
+        print("Failed to create AWS client")
+        exit(1)
+
+def find_expired_amis(ec2_client):
+    """Get all AMIs owned by the account that are scheduled for delete and past their DaysToKeep (paginated)"""
+    expired = []
+    time_now = datetime.datetime.now(datetime.timezone.utc)
+    time_now = time_now.replace(tzinfo=None, microsecond=0)
+    paginator = ec2_client.get_paginator('describe_images')
+    pages = paginator.paginate(
         Owners=['self'],
         Filters=[
             {
@@ -15,34 +43,205 @@ def delete_old_amis():
             }
         ]
     )
-    for image in response['Images']:
-        ami_id = image['ImageId']
-        creation_date = image['CreationDate']  # Format: YYYY-MM-DDTHH:MM:SS.SSSZ
-        creation_date = datetime.datetime.strptime(creation_date, "%Y-%m-%dT%H:%M:%S.%fZ")
-
-        # Get AMI tags
-        tags = {tag['Key']: tag['Value'] for tag in image.get('Tags', [])}
-        
-        if tags.get('ScheduledForDelete') != 'True':
-            continue  # Skip AMIs that aren't marked for deletion
-
-        days_to_keep = int(tags.get('DaysToKeep', 30))  # Default to 30 if not present
-        expiration_date = creation_date + datetime.timedelta(days=days_to_keep)
-        time_now = datetime.datetime.now(datetime.timezone.utc)
-        time_now = time_now.replace(tzinfo=None, microsecond=0)
-        if time_now >= expiration_date:
-            print(f"Deleting AMI: {ami_id} (Created: {creation_date}, Expired: {expiration_date})")
-
-            # Deregister AMI
-            ec2_client.deregister_image(ImageId=ami_id)
-            time.sleep(5)
-            
-            # Get associated snapshots
-            for block_device in image.get('BlockDeviceMappings', []):
-                if 'Ebs' in block_device:
-                    snapshot_id = block_device['Ebs']['SnapshotId']
-                    print(f"Deleting snapshot: {snapshot_id}")
-                    ec2_client.delete_snapshot(SnapshotId=snapshot_id)
+    for page in pages:
+        for image in page['Images']:
+            creation_date = image['CreationDate']  # Format: YYYY-MM-DDTHH:MM:SS.SSSZ
+            creation_date = datetime.datetime.strptime(creation_date, "%Y-%m-%dT%H:%M:%S.%fZ")
+
+            # Get AMI tags
+            tags = {tag['Key']: tag['Value'] for tag in image.get('Tags', [])}
+
+            if tags.get('ScheduledForDelete') != 'True':
+                continue  # Skip AMIs that aren't marked for deletion
+
+            days_to_keep = int(tags.get('DaysToKeep', 30))  # Default to 30 if not present
+            expiration_date = creation_date + datetime.timedelta(days=days_to_keep)
+            if time_now >= expiration_date:
+                print(f"Expired AMI: {image['ImageId']} (Created: {creation_date}, Expired: {expiration_date})")
+                expired.append(image)
+    return expired
+
+def deregister_ami(image, ec2_client):
+    """Deregister an AMI. Returns True when it succeeded."""
+    try:
+        ec2_client.deregister_image(ImageId=image['ImageId'])
+        print(f"Deregistered AMI: {image['ImageId']}")
+        return True
+    except ClientError as e:
+        print(f"Failed to deregister AMI {image['ImageId']}: {e}")
+        return False
+
+def delete_snapshot(snapshot_id, ec2_client, in_use_retries=SNAPSHOT_IN_USE_RETRIES):
+    """Delete a snapshot, retrying while it is still reported in use by the deregistered AMI. Returns True when it succeeded."""
+    for attempt in range(in_use_retries):
+        try:
+            ec2_client.delete_snapshot(SnapshotId=snapshot_id)
+            print(f"Deleted snapshot: {snapshot_id}")
+            return True
+        except ClientError as e:
+            if e.response['Error']['Code'] == 'InvalidSnapshot.InUse' and attempt < in_use_retries - 1:
+                time.sleep(2 ** attempt)
+                continue
+            print(f"Failed to delete snapshot {snapshot_id}: {e}")
+            return False
+
+def delete_old_amis(ec2_client, workers=MAX_WORKERS, dry_run=False):
+    """
+    Delete the expired AMIs and their snapshots.
+    The AMIs are deregistered concurrently, then their deregistration is confirmed with batched describe calls,
+    and the snapshots of each AMI are deleted concurrently as soon as the AMI is confirmed gone.
+
+    :param ec2_client: EC2 client
+    :param workers: Number of concurrent deregister/delete calls
+    :param dry_run: Only list the expired AMIs and their snapshots
+    :return: Number of failed deregistrations and snapshot deletions
+    """
+    expired = find_expired_amis(ec2_client)
+    snapshots = {
+        image['ImageId']: [bd['Ebs']['SnapshotId'] for bd in image.get('BlockDeviceMappings', []) if bd.get('Ebs', {}).get('SnapshotId')]
+        for image in expired
+    }
+    print(f"{len(expired)} expired AMIs with {sum(len(ids) for ids in snapshots.values())} snapshots.")
+    if dry_run or not expired:
+        for ami_id, snapshot_ids in snapshots.items():
+            print(f"Would delete AMI {ami_id} and snapshots {', '.join(snapshot_ids) or '-'}")
+        return 0
+
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        results = list(executor.map(lambda image: deregister_ami(image, ec2_client), expired))
+        deregistered = [image['ImageId'] for image, ok in zip(expired, results) if ok]
+
+        # Delete the snapshots of each AMI as soon as its deregistration is confirmed
+        deletions = []
+        confirmed = []
+        def delete_ami_snapshots(image):
+            confirmed.append(image['ImageId'])
+            for snapshot_id in snapshots[image['ImageId']]:
+                deletions.append(executor.submit(delete_snapshot, snapshot_id, ec2_client))
+        try:
+            failed = wait_for(ec2_client, 'image', deregistered, 'deregistered', timeout=600, base_delay=1, max_delay=10, on_done=delete_ami_snapshots)
+        except (ClientError, TimeoutError) as e:
+            print(f"Failed to confirm the AMI deregistrations: {e}")
+            failed = set()
+        snapshot_failures = sum(1 for deletion in deletions if not deletion.result())
+
+    # Snapshots of the AMIs that failed or are still pending are kept, they may still be in use
+    unconfirmed = sorted(failed) + [ami_id for ami_id in deregistered if ami_id not in confirmed and ami_id not in failed]
+    for ami_id in unconfirmed:
+        print(f"AMI {ami_id} deregistration not confirmed, kept its snapshots {', '.join(snapshots[ami_id]) or '-'}")
+    failures = len(expired) - len(confirmed) + snapshot_failures
+    print(f"Deleted {len(confirmed)} AMIs and {len(deletions) - snapshot_failures} snapshots, {failures} failures.")
+    return failures
+
+def paginate(ec2_client, operation, result_key, **params):
+    """List all items of a paginated describe call."""
+    items = []
+    for page in ec2_client.get_paginator(operation).paginate(**params):
+        items += page[result_key]
+    return items
+
+def block_device_snapshots(block_device_mappings):
+    """Get the snapshot IDs of AMI or launch template block device mappings."""
+    return [bd['Ebs']['SnapshotId'] for bd in block_device_mappings or [] if bd.get('Ebs', {}).get('SnapshotId')]
+
+def build_snapshot_index(ec2_client):
+    """
+    Build an in-memory index of the owned snapshots and of everything referencing them, from paginated bulk listings
+    (one listing per resource type instead of one call per snapshot).
+    A snapshot is referenced by an owned AMI using it, a volume created from it, or a launch template version using it.
+
+    :param ec2_client: EC2 client
+    :return: Dictionary of snapshot ID to snapshot, and dictionary of snapshot ID to the list of its references
+    """
+    snapshots = {s['SnapshotId']: s for s in paginate(ec2_client, 'describe_snapshots', 'Snapshots', OwnerIds=['self'])}
+    references = {}
+    def add_reference(snapshot_id, reference):
+        references.setdefault(snapshot_id, []).append(reference)
+
+    images = paginate(ec2_client, 'describe_images', 'Images', Owners=['self'])
+    for image in images:
+        for snapshot_id in block_device_snapshots(image.get('BlockDeviceMappings')):
+            add_reference(snapshot_id, image['ImageId'])
+    volumes = paginate(ec2_client, 'describe_volumes', 'Volumes')
+    for volume in volumes:
+        if volume.get('SnapshotId'):
+            add_reference(volume['SnapshotId'], volume['VolumeId'])
+    templates = paginate(ec2_client, 'describe_launch_templates', 'LaunchTemplates')
+    for template in templates:
+        versions = paginate(ec2_client, 'describe_launch_template_versions', 'LaunchTemplateVersions', LaunchTemplateId=template['LaunchTemplateId'])
+        for version in versions:
+            data = version.get('LaunchTemplateData', {})
+            for snapshot_id in block_device_snapshots(data.get('BlockDeviceMappings')):
+                add_reference(snapshot_id, f"{template['LaunchTemplateId']} v{version['VersionNumber']}")
+    print(f"Indexed {len(snapshots)} snapshots, {len(images)} AMIs, {len(volumes)} volumes and {len(templates)} launch templates.")
+    return snapshots, references
+
+def is_managed_snapshot(snapshot):
+    """Check whether the snapshot is managed by AWS Backup or Data Lifecycle Manager."""
+    return any(tag['Key'].startswith(MANAGED_TAG_PREFIX) for tag in snapshot.get('Tags', []))
+
+def reconcile_snapshots(ec2_client, older_than_days=RECONCILE_MIN_AGE_DAYS, delete=False, workers=MAX_WORKERS):
+    """
+    Find the owned snapshots that nothing references anymore (e.g. left behind by failed encryptions or volume swaps)
+    and report or delete them. Snapshots that are not completed, younger than older_than_days, or managed by
+    AWS Backup / Data Lifecycle Manager are kept.
+
+    :param ec2_client: EC2 client
+    :param older_than_days: Minimum age in days of the reported snapshots
+    :param delete: Delete the unreferenced snapshots instead of only reporting them
+    :param workers: Number of concurrent delete calls
+    :return: Number of failed snapshot deletions
+    """
+    snapshots, references = build_snapshot_index(ec2_client)
+    cutoff = datetime.datetime.now(datetime.timezone.utc) - datetime.timedelta(days=older_than_days)
+    orphans = [
+        s for s in snapshots.values()
+        if s['SnapshotId'] not in references and s['State'] == 'completed' and s['StartTime'] < cutoff and not is_managed_snapshot(s)
+    ]
+    orphans.sort(key=lambda s: s['StartTime'])
+    for snapshot in orphans:
+        print(f"Unreferenced snapshot: {snapshot['SnapshotId']} (Created: {snapshot['StartTime']:%Y-%m-%d}, "
+              f"Size: {snapshot['VolumeSize']} GiB, Volume: {snapshot.get('VolumeId', '-')}, Description: {snapshot.get('Description', '')})")
+    print(f"{len(orphans)} unreferenced snapshots older than {older_than_days} days, {sum(s['VolumeSize'] for s in orphans)} GiB.")
+    if not delete or not orphans:
+        return 0
+
+    # A snapshot reported in use here was referenced after the index was built, so it is not retried
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        results = list(executor.map(lambda s: delete_snapshot(s['SnapshotId'], ec2_client, in_use_retries=1), orphans))
+    failures = results.count(False)
+    print(f"Deleted {len(orphans) - failures} snapshots, {failures} failures.")
+    return failures
 
 if __name__ == "__main__":
-    delete_old_amis()
+    parser = argparse.ArgumentParser()
+    parser.add_argument(
+        "--region", type=str, required=False, help="Region Name"
+    )
+    parser.add_argument(
+        "--workers", type=int, default=MAX_WORKERS, help=f"Number of concurrent deregister/delete calls (default {MAX_WORKERS})"
+    )
+    parser.add_argument(
+        "--dry-run", action="store_true", help="Only list the expired AMIs and their snapshots"
+    )
+    parser.add_argument(
+        "--reconcile", action="store_true",
+        help="Report the snapshots not referenced by any AMI, volume or launch template instead of deleting expired AMIs"
+    )
+    parser.add_argument(
+        "--older-than-days", type=int, default=RECONCILE_MIN_AGE_DAYS,
+        help=f"Only report unreferenced snapshots older than this (default {RECONCILE_MIN_AGE_DAYS})"
+    )
+    parser.add_argument(
+        "--delete", action="store_true", help="Delete the unreferenced snapshots found by --reconcile"
+    )
+    args = parser.parse_args()
+    if args.delete and not args.reconcile:
+        parser.error("--delete requires --reconcile")
+    ec2_client = init_aws_client(args.region)
+    if args.reconcile:
+        failures = reconcile_snapshots(ec2_client, args.older_than_days, args.delete and not args.dry_run, args.workers)
+    else:
+        failures = delete_old_amis(ec2_client, args.workers, args.dry_run)
+    if failures:
+        exit(1)
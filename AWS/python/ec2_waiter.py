@@ -0,0 +1,173 @@
+"""
+Waits for many EC2 resources at once.
+
+Instead of one describe call (or one boto3 waiter) per resource, the pending IDs are described together in
+batches, and the polls back off exponentially with jitter until an overall deadline.
+wait_for blocks, wait_for_async is the asyncio version, so several waits can run concurrently with asyncio.gather.
+
+Example:
+    failed = wait_for(ec2_client, "snapshot", snapshot_ids, "completed")
+    await asyncio.gather(
+        wait_for_async(ec2_client, "volume", volume_ids, "available"),
+        wait_for_async(ec2_client, "image", image_ids, "available"),
+    )
+"""
+import asyncio
+import random
+import time
+
+from botocore.exceptions import ClientError
+
+# Number of IDs sent in a single describe call
+DESCRIBE_BATCH_SIZE = 200
+
+# Describe call, ID parameter, result key, ID key and failure states of each resource kind
+RESOURCE_KINDS = {
+    "snapshot": ("describe_snapshots", "SnapshotIds", "Snapshots", "SnapshotId", {"error"}),
+    "volume": ("describe_volumes", "VolumeIds", "Volumes", "VolumeId", {"error"}),
+    "instance": ("describe_instances", "InstanceIds", "Reservations", "InstanceId", {"terminated"}),
+    "image": ("describe_images", "ImageIds", "Images", "ImageId", {"failed", "error", "invalid", "deregistered"}),
+}
+
+# Target states reached when the resource is not returned by describe anymore
+GONE_STATES = ("deregistered", "deleted", "terminated")
+
+# Errors that only mean "try again later" (resources that are not visible yet are handled per ID)
+RETRYABLE_ERRORS = ("RequestLimitExceeded", "Throttling", "ThrottlingException")
+
+
+def chunks(items, size=DESCRIBE_BATCH_SIZE):
+    """Split a list into lists of at most size items."""
+    return [items[i:i + size] for i in range(0, len(items), size)]
+
+
+def get_state(kind, resource):
+    """Get the state of a described resource."""
+    if kind == "instance":
+        return resource["State"]["Name"]
+    return resource["State"]
+
+
+def describe_batch(ec2_client, kind, batch, missing):
+    """Describe one batch. When missing is a list, IDs that are not found are bisected out of the batch and added to it."""
+    operation, id_param, result_key, _, _ = RESOURCE_KINDS[kind]
+    try:
+        response = getattr(ec2_client, operation)(**{id_param: batch})
+    except ClientError as e:
+        if missing is None or not e.response["Error"]["Code"].endswith(".NotFound"):
+            raise
+        if len(batch) == 1:
+            missing.append(batch[0])
+            return []
+        half = len(batch) // 2
+        return describe_batch(ec2_client, kind, batch[:half], missing) + describe_batch(ec2_client, kind, batch[half:], missing)
+    if kind == "instance":
+        return [instance for reservation in response[result_key] for instance in reservation["Instances"]]
+    return response[result_key]
+
+
+def describe_resources(ec2_client, kind, ids, missing=None):
+    """
+    Describe many resources of one kind, in batches.
+
+    :param ec2_client: EC2 client
+    :param kind: snapshot, volume, instance or image
+    :param ids: IDs of the resources
+    :param missing: List collecting the IDs that are not found, so that one of them does not fail its whole batch.
+                    When None, a NotFound error is raised
+    :return: List of the described resources
+    """
+    resources = []
+    for batch in chunks(list(ids)):
+        resources += describe_batch(ec2_client, kind, batch, missing)
+    return resources
+
+
+class PendingResources:
+    """Pending resources of one wait, with the backoff state of its polls."""
+
+    def __init__(self, ec2_client, kind, ids, state, timeout, base_delay, max_delay, on_done):
+        self.ec2_client = ec2_client
+        self.kind = kind
+        self.state = state
+        self.total = len(set(ids))
+        self.pending = set(ids)
+        self.failed = set()
+        self.deadline = time.monotonic() + timeout
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.attempt = 0
+        self.on_done = on_done
+
+    def add(self, ids):
+        """Track more resources in the same wait (e.g. copies started while others are still pending)."""
+        self.total += len(set(ids) - self.pending)
+        self.pending.update(ids)
+
+    def poll(self):
+        """Describe the pending resources once. Returns True when none is pending anymore."""
+        id_key, failure_states = RESOURCE_KINDS[self.kind][3], RESOURCE_KINDS[self.kind][4]
+        # Resources that are not found are either gone or not visible yet, the rest of their batch is still described
+        try:
+            resources = describe_resources(self.ec2_client, self.kind, sorted(self.pending), missing=[])
+        except ClientError as e:
+            if e.response["Error"]["Code"] not in RETRYABLE_ERRORS:
+                raise
+            resources = None
+        if resources is not None and self.state in GONE_STATES:
+            returned = {resource[id_key] for resource in resources}
+            gone_state = {"Name": self.state} if self.kind == "instance" else self.state
+            resources += [{id_key: resource_id, "State": gone_state} for resource_id in self.pending - returned]
+        for resource in resources or []:
+            resource_id = resource[id_key]
+            state = get_state(self.kind, resource)
+            if state == self.state:
+                self.pending.discard(resource_id)
+                if self.on_done:
+                    self.on_done(resource)
+            elif state in failure_states:
+                print(f"{self.kind.capitalize()} {resource_id} is {state}.")
+                self.pending.discard(resource_id)
+                self.failed.add(resource_id)
+        if not self.pending:
+            return True
+        if time.monotonic() >= self.deadline:
+            raise TimeoutError(f"Timed out waiting for {self.kind}s {', '.join(sorted(self.pending))} to be {self.state}.")
+        print(f"{len(self.pending)} of {self.total} {self.kind}s not {self.state} yet. Waiting...")
+        return False
+
+    def next_delay(self):
+        """Exponential backoff with jitter, never past the deadline."""
+        delay = min(self.max_delay, self.base_delay * 2 ** self.attempt)
+        self.attempt += 1
+        delay = delay / 2 + random.uniform(0, delay / 2)
+        return max(0, min(delay, self.deadline - time.monotonic()))
+
+
+def wait_for(ec2_client, kind, ids, state, timeout=3600, base_delay=2, max_delay=30, on_done=None):
+    """
+    Wait for all resources to reach a state, describing the pending ones together on every poll.
+
+    :param ec2_client: EC2 client
+    :param kind: snapshot, volume, instance or image
+    :param ids: IDs of the resources
+    :param state: State to wait for (e.g. completed, available, in-use, stopped, running). For deregistered, deleted
+                  and terminated, resources that are not returned by describe anymore count as done
+    :param timeout: Overall deadline in seconds, a TimeoutError is raised when it passes
+    :param base_delay: First poll interval in seconds, doubled on every poll
+    :param max_delay: Maximum poll interval in seconds
+    :param on_done: Called with the described resource as soon as each resource reaches the state
+    :return: Set of the IDs that ended in a failure state instead
+    """
+    pending = PendingResources(ec2_client, kind, ids, state, timeout, base_delay, max_delay, on_done)
+    while pending.pending and not pending.poll():
+        time.sleep(pending.next_delay())
+    return pending.failed
+
+
+async def wait_for_async(ec2_client, kind, ids, state, timeout=3600, base_delay=2, max_delay=30, on_done=None):
+    """Asyncio version of wait_for. The describe calls run in a thread, so other waits keep running."""
+    pending = PendingResources(ec2_client, kind, ids, state, timeout, base_delay, max_delay, on_done)
+    while pending.pending and not await asyncio.to_thread(pending.poll):
+        await asyncio.sleep(pending.next_delay())
+    return pending.failed
@@ -1,16 +1,22 @@
-import pandas as pd
 import boto3
 import argparse
 import datetime
+import json
+import os
+import sys
+
+# Log messages go to stdout by default. Query mode switches this to stderr so
+# that stdout only carries the JSON document.
+log_stream = sys.stdout
 
 
 def logActions(level, short_desc, long_desc):
     dt_object = datetime.datetime.now()
     dt_string = dt_object.strftime("%m/%d/%Y %H:%M:%S")
     prefix = f"{dt_string} - {level}:"
-    print(f"{prefix} {short_desc}")
+    print(f"{prefix} {short_desc}", file=log_stream)
     if long_desc:
-        print(f"{prefix} {long_desc}")
+        print(f"{prefix} {long_desc}", file=log_stream)
 
 
 def init_aws_clients(region):
@@ -28,6 +34,9 @@ def init_aws_clients(region):
 
 
 def read_excel(file_path):
+    # pandas is only needed for the XLSX backend, so import it on demand
+    import pandas as pd
+
     try:
         df = pd.read_excel(file_path, sheet_name="List")
         logActions("INF", f"Successfully parsed XLS document ({file_path})", None)
@@ -320,51 +329,251 @@ def get_ec2_details(instance_list, ec2_client):
     return instance_data, security_rules_data, volume_data, instance_tags_data
 
 
-def update_workbook(
-    instance_data, security_rules_data, volume_data, instance_tags_data, file_path
-):
-    try:
-        # Convert to DataFrames
-        instance_df = pd.DataFrame(instance_data)
-        security_rules_df = pd.DataFrame(security_rules_data)
-        volume_df = pd.DataFrame(volume_data)
-        instance_tags_df = pd.DataFrame(instance_tags_data)
+# Columns of each output sheet/table, in the order get_instance_info builds the rows
+DATASET_COLUMNS = {
+    "EC2_Details": [
+        "InstanceName", "InstanceID", "PrivateIPs", "InstanceType", "OS", "VPC_Name",
+        "Subnet_Name", "VPC_ID", "Subnet_ID", "SecurityGroupNames", "SecurityGroupIDs",
+    ],
+    "EC2_SG_Details": [
+        "InstanceName", "InstanceID", "SecurityGroupName", "SecurityGroupID", "Direction",
+        "Protocol", "FromPort", "ToPort", "CIDR", "RuleDescription",
+    ],
+    "EC2_Vol_Details": [
+        "InstanceName", "InstanceID", "VolumeName", "VolumeId", "DeviceName", "Type",
+        "Size", "IOPS", "Throughput", "Encrypted", "State",
+    ],
+    "EC2_Tag_Details": ["InstanceName", "InstanceID", "TagKey", "TagValue"],
+}
+
+
+def get_dataset_columns(name, rows):
+    """Columns of a dataset, the known ones even when it has no rows, then any other key in first-seen order."""
+    return list(dict.fromkeys(DATASET_COLUMNS.get(name, []) + [key for row in rows for key in row]))
+
+
+def build_datasets(instance_data, security_rules_data, volume_data, instance_tags_data):
+    """Map each output sheet/table name to its rows."""
+    return {
+        "EC2_Details": instance_data,
+        "EC2_SG_Details": security_rules_data,
+        "EC2_Vol_Details": volume_data,
+        "EC2_Tag_Details": instance_tags_data,
+    }
 
+
+def update_workbook(datasets, file_path):
+    # pandas/openpyxl are heavy imports, only load them when writing XLSX
+    import pandas as pd
+
+    try:
         # Save all DataFrames to Excel
-        with pd.ExcelWriter(
-            file_path, engine="openpyxl", mode="w"
-        ) as writer:
-            instance_df.to_excel(writer, sheet_name="EC2_Details", index=False)
-            security_rules_df.to_excel(writer, sheet_name="EC2_SG_Details", index=False)
-            volume_df.to_excel(writer, sheet_name="EC2_Vol_Details", index=False)
-            instance_tags_df.to_excel(writer, sheet_name="EC2_Tag_Details", index=False)
+        with pd.ExcelWriter(file_path, engine="openpyxl", mode="w") as writer:
+            for sheet_name, rows in datasets.items():
+                pd.DataFrame(rows, columns=get_dataset_columns(sheet_name, rows)).to_excel(
+                    writer, sheet_name=sheet_name, index=False
+                )
 
         logActions("INF", f"Successfully updated XLS document ({file_path})", None)
     except Exception as e:
         logActions("ERR", f"Failed to update XLS document ({file_path})", e)
 
 
+def write_csv_files(datasets, dir_path):
+    import csv
+
+    try:
+        os.makedirs(dir_path, exist_ok=True)
+        for name, rows in datasets.items():
+            file_path = os.path.join(dir_path, f"{name}.csv")
+            # Rows of the same dataset may not share all keys
+            fieldnames = get_dataset_columns(name, rows)
+            with open(file_path, "w", newline="") as f:
+                writer = csv.DictWriter(f, fieldnames=fieldnames)
+                writer.writeheader()
+                writer.writerows(rows)
+
+        logActions("INF", f"Successfully wrote CSV files ({dir_path})", None)
+    except Exception as e:
+        logActions("ERR", f"Failed to write CSV files ({dir_path})", e)
+
+
+def write_json_file(datasets, file_path):
+    try:
+        with open(file_path, "w") as f:
+            json.dump(datasets, f, indent=2, default=str)
+
+        logActions("INF", f"Successfully wrote JSON document ({file_path})", None)
+    except Exception as e:
+        logActions("ERR", f"Failed to write JSON document ({file_path})", e)
+
+
+# Indexes created on the SQLite tables (table, columns)
+SQLITE_INDEXES = [
+    ("EC2_Details", ["InstanceID"]),
+    ("EC2_Details", ["Subnet_ID"]),
+    ("EC2_SG_Details", ["InstanceID"]),
+    ("EC2_SG_Details", ["SecurityGroupID"]),
+    ("EC2_Vol_Details", ["InstanceID"]),
+    ("EC2_Vol_Details", ["Type"]),
+    ("EC2_Tag_Details", ["InstanceID"]),
+    ("EC2_Tag_Details", ["TagKey", "TagValue"]),
+]
+
+
+def write_sqlite_db(datasets, file_path):
+    import sqlite3
+
+    try:
+        conn = sqlite3.connect(file_path)
+        with conn:
+            for name, rows in datasets.items():
+                conn.execute(f'DROP TABLE IF EXISTS "{name}"')
+                # Empty datasets still get their table, so queries on them return no rows
+                columns = get_dataset_columns(name, rows)
+                # Columns are left untyped so numbers stay numbers and "N/A"/"All" stay text
+                column_list = ", ".join(f'"{column}"' for column in columns)
+                conn.execute(f'CREATE TABLE "{name}" ({column_list})')
+                placeholders = ", ".join("?" for _ in columns)
+                conn.executemany(
+                    f'INSERT INTO "{name}" ({column_list}) VALUES ({placeholders})',
+                    ([row.get(column) for column in columns] for row in rows),
+                )
+
+            for table, columns in SQLITE_INDEXES:
+                table_columns = [
+                    info[1] for info in conn.execute(f'PRAGMA table_info("{table}")')
+                ]
+                if not set(columns).issubset(table_columns):
+                    continue
+                index_name = f"idx_{table}_{'_'.join(columns)}"
+                column_list = ", ".join(f'"{column}"' for column in columns)
+                conn.execute(
+                    f'CREATE INDEX IF NOT EXISTS "{index_name}" ON "{table}" ({column_list})'
+                )
+        conn.close()
+
+        logActions("INF", f"Successfully wrote SQLite database ({file_path})", None)
+    except Exception as e:
+        logActions("ERR", f"Failed to write SQLite database ({file_path})", e)
+
+
+def query_sqlite_db(file_path, sql, as_json):
+    """Run a SQL statement against a database written by write_sqlite_db and print the result."""
+    import sqlite3
+
+    if not os.path.isfile(file_path):
+        logActions("ERR", f"SQLite database not found ({file_path})", None)
+        exit(1)
+
+    try:
+        conn = sqlite3.connect(f"file:{file_path}?mode=ro", uri=True)
+        cursor = conn.execute(sql)
+        columns = [col[0] for col in cursor.description or []]
+        rows = cursor.fetchall()
+        conn.close()
+    except Exception as e:
+        logActions("ERR", f"Failed to query SQLite database ({file_path})", e)
+        exit(1)
+
+    if as_json:
+        json.dump([dict(zip(columns, row)) for row in rows], sys.stdout, indent=2)
+        print()
+    else:
+        print("\t".join(columns))
+        for row in rows:
+            print("\t".join("" if value is None else str(value) for value in row))
+
+
+# Output backends and their default output path
+OUTPUT_WRITERS = {
+    "xlsx": (update_workbook, "EC2_Details.xlsx"),
+    "csv": (write_csv_files, "EC2_Details"),
+    "json": (write_json_file, "EC2_Details.json"),
+    "sqlite": (write_sqlite_db, "EC2_Details.db"),
+}
+
+
+def query_instance(instance_id, ec2_client):
+    """Print the details of a single instance as JSON on stdout."""
+    try:
+        instance_info, security_rules, volumes, instance_tags = get_instance_info(
+            instance_id, ec2_client
+        )
+    except Exception as e:
+        logActions("ERR", f"Failed to parse info for instance {instance_id}", e)
+        exit(1)
+
+    datasets = build_datasets([instance_info], security_rules, volumes, instance_tags)
+    json.dump(datasets, sys.stdout, indent=2, default=str)
+    print()
+
+
 if __name__ == "__main__":
     parser = argparse.ArgumentParser()
 
     parser.add_argument("--region", type=str, required=False, help="Region Name")
     parser.add_argument(
-        "--workbook-path", type=str, required=False, help="Path to the XLSX file"
+        "--workbook-path",
+        "--output-path",
+        dest="output_path",
+        type=str,
+        required=False,
+        help="Path to the output file (a directory for csv output)",
+    )
+    parser.add_argument(
+        "--output-format",
+        choices=list(OUTPUT_WRITERS),
+        default="xlsx",
+        help="Output format (default: xlsx)",
     )
+    parser.add_argument(
+        "--instance-id",
+        type=str,
+        required=False,
+        help="Only print the details of this instance as JSON on stdout",
+    )
+    subparsers = parser.add_subparsers(dest="command")
+    query_parser = subparsers.add_parser(
+        "query", help="Run a SQL query against an inventory written with --output-format sqlite"
+    )
+    query_parser.add_argument(
+        "--db-path",
+        type=str,
+        default=OUTPUT_WRITERS["sqlite"][1],
+        help="Path to the SQLite database",
+    )
+    query_parser.add_argument(
+        "--json", action="store_true", help="Print the result as JSON instead of TSV"
+    )
+    query_parser.add_argument("sql", type=str, help="SQL statement to execute")
     # Parse the arguments
     args = parser.parse_args()
     region = args.region
-    file_path = args.workbook_path
 
+    if args.command == "query":
+        log_stream = sys.stderr
+        query_sqlite_db(args.db_path, args.sql, args.json)
+        exit(0)
+
+    if args.instance_id:
+        log_stream = sys.stderr
+        ec2_client = init_aws_clients(region)
+        query_instance(args.instance_id, ec2_client)
+        exit(0)
+
+    writer, default_path = OUTPUT_WRITERS[args.output_format]
+    file_path = args.output_path
     if file_path == None:
-        file_path = "EC2_Details.xlsx"
+        file_path = default_path
 
     ec2_client = init_aws_clients(region)
     instance_list = get_instance_list(ec2_client)
     instance_data, security_rules_data, volume_data, instance_tags_data = (
         get_ec2_details(instance_list, ec2_client)
     )
-    update_workbook(
-        instance_data, security_rules_data, volume_data, instance_tags_data, file_path
+    datasets = build_datasets(
+        instance_data, security_rules_data, volume_data, instance_tags_data
     )
+    writer(datasets, file_path)
     logActions("INF", f"Execution finished", None)
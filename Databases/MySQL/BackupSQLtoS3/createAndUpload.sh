@@ -9,6 +9,8 @@ BACKUP_DIR="$(cat $varFile | grep -E "^BACKUP_DIR" | awk -F'=' '{print $2}')"
 SCRIPT_LOG_DIR="$(cat $varFile | grep -E "^SCRIPT_LOG_DIR" | awk -F'=' '{print $2}')"
 BACKUP_FILE="${BACKUP_DIR}/${DB_NAME}-bak-$(date +'%Y%m%d_%H%M%S_%z').sql"
 PYTHON_ENV="$(cat $varFile | grep -E "^PYTHON_ENV" | awk -F'=' '{print $2}')"
+BACKUP_UPLOAD_MODE="$(cat $varFile | grep -E "^BACKUP_UPLOAD_MODE" | awk -F'=' '{print $2}')"
+BACKUP_RETENTION_COUNT="$(cat $varFile | grep -E "^BACKUP_RETENTION_COUNT" | awk -F'=' '{print $2}')"
 
 dateToday="$(date +'%Y%m%d')"
 logFile="$SCRIPT_LOG_DIR/${dateToday}_dbBackups.log"
@@ -25,28 +27,11 @@ mkdir -p "$SCRIPT_LOG_DIR"
 # Ensure the backup directory exists
 mkdir -p "$BACKUP_DIR"
 
-# Perform the backup using mysqldump
-print_line "Creating backup..."
-mysqldump \
-    --databases "$DB_NAME" \
-    --add-drop-database \
-    --add-drop-table \
-    --create-options \
-    --add-locks \
-    --lock-tables \
-    --flush-logs \
-    --master-data > "$BACKUP_FILE"
-
-# Compress the backup file with gzip
-print_line "Compressing the backup..."
-gzip "$BACKUP_FILE"
-
-# Unlock the database after the backup
-print_line "Unlocking database..."
-mysql -e "UNLOCK TABLES;"
-
-# Provide feedback
-print_line "Backup completed and saved to $BACKUP_FILE.gz"
+# The Python scripts share ../scriptConfig.py, copy it next to them when deploying this folder on its own
+if [[ ! -f "$scriptDir/scriptConfig.py" && ! -f "$scriptDir/../scriptConfig.py" ]]; then
+    print_line "ERROR: scriptConfig.py not found in $scriptDir or its parent directory. Exiting..."
+    exit 1
+fi
 
 if [[ "$PYTHON_ENV" != 'NONE' && "$PYTHON_ENV" != 'none' ]]; then
     [ ! -d "$PYTHON_ENV" ] && {
@@ -60,7 +45,64 @@ if [[ "$PYTHON_ENV" != 'NONE' && "$PYTHON_ENV" != 'none' ]]; then
     source "$PYTHON_ENV/bin/activate"
 fi
 
-python3 uploadBackupsToS3.py "$BACKUP_FILE.gz"
+run_mysqldump() {
+    mysqldump \
+        --databases "$DB_NAME" \
+        --add-drop-database \
+        --add-drop-table \
+        --create-options \
+        --add-locks \
+        --lock-tables \
+        --flush-logs \
+        --master-data
+}
+
+if [[ "$BACKUP_UPLOAD_MODE" == 'parallel' ]]; then
+    # Dump the tables with parallel workers under one read lock, each table is uploaded as it is dumped
+    print_line "Creating and uploading parallel backup..."
+    python3 uploadBackupsToS3.py --parallel-dump || {
+        print_line "ERROR: Backup failed. Exiting..."
+        exit 1
+    }
+    print_line "Backup completed and uploaded"
+elif [[ "$BACKUP_UPLOAD_MODE" == 'stream' ]]; then
+    # Pipe the dump straight into the upload, it is compressed on the fly and never lands on disk
+    print_line "Creating and uploading backup..."
+    set -o pipefail
+    run_mysqldump | python3 uploadBackupsToS3.py - --name "$(basename "$BACKUP_FILE")" || {
+        print_line "ERROR: Backup failed. Exiting..."
+        mysql -e "UNLOCK TABLES;"
+        exit 1
+    }
+    set +o pipefail
+
+    # Unlock the database after the backup
+    print_line "Unlocking database..."
+    mysql -e "UNLOCK TABLES;"
+
+    print_line "Backup completed and uploaded"
+else
+    # Perform the backup using mysqldump
+    print_line "Creating backup..."
+    run_mysqldump > "$BACKUP_FILE"
+
+    # Compress the backup file with gzip
+    print_line "Compressing the backup..."
+    gzip "$BACKUP_FILE"
+
+    # Unlock the database after the backup
+    print_line "Unlocking database..."
+    mysql -e "UNLOCK TABLES;"
+
+    # Provide feedback
+    print_line "Backup completed and saved to $BACKUP_FILE.gz"
+
+    python3 uploadBackupsToS3.py "$BACKUP_FILE.gz"
+fi
 
 python3 uploadLogsToS3.py
 
+# Prune the backups and binary logs in S3 that are no longer needed
+if [[ -n "$BACKUP_RETENTION_COUNT" && "$BACKUP_RETENTION_COUNT" != '0' ]]; then
+    python3 uploadBackupsToS3.py --apply-retention
+fi
@@ -1,24 +1,78 @@
 import boto3
+from boto3.s3.transfer import TransferConfig
 import os
 from pathlib import Path
 from botocore.exceptions import NoCredentialsError, ClientError
 import time
-from datetime import datetime
+import random
+from datetime import datetime, timezone
 import logging
 import sys
+import json
+import re
+import zlib
+import bisect
+import hashlib
+import argparse
+import subprocess
+from concurrent.futures import ThreadPoolExecutor, as_completed
 
-def getVarValue(varKey):
-    varValue = None
-    with open(varFile, 'r') as file:
-        for line in file:
-            if line.startswith(varKey + '='):
-                varValue = line.strip().split('=')[1]
-                break
+# scriptConfig.py is shared by the MySQL scripts and lives one directory up. A copy next to
+# this script takes precedence, for deployments of this folder on its own
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+from scriptConfig import load_config, log_env_overrides, ConfigError
 
-    if not varValue:
-        raise ValueError( varKey + " not found in " + varFile)
-    else:
-        return varValue
+# Optional, only needed for BACKUP_COMPRESSION=zstd
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+# Catalog of the uploaded backups, stored next to them under the backups prefix
+CATALOG_FILE_NAME = "_catalog.json"
+
+# Attempts of a catalog update when other runs keep changing the catalog in between
+CATALOG_UPDATE_ATTEMPTS = 10
+
+# Pattern of the -- CHANGE MASTER TO line written by mysqldump --master-data
+CHANGE_MASTER_PATTERN = re.compile(
+    rb"--\s*CHANGE MASTER TO MASTER_LOG_FILE='([^']+)',\s*MASTER_LOG_POS=(\d+);"
+)
+
+# Timestamp part of the backup file names created by createAndUpload.sh
+BACKUP_NAME_PATTERN = re.compile(r"-bak-(\d{8}_\d{6}_[+-]\d{4})\.sql")
+
+# Manifest of a parallel (per-table) backup, stored in the backup's own folder
+MANIFEST_FILE_NAME = "_manifest.json"
+
+# Last line printed by the lock session of a parallel backup once its setup statements ran
+LOCK_SESSION_MARKER = "END"
+
+# File suffix of each supported compression
+COMPRESSION_SUFFIXES = {"gzip": ".gz", "zstd": ".zst"}
+
+# Shared by all the uploads and catalog updates of a run
+s3Client = None
+
+# Variables of variables.txt used by this script
+CONFIG_SPEC = {
+    "SCRIPT_LOG_DIR": {},
+    "DB_NAME": {},
+    "BACKUP_DIR": {},
+    "BUCKET_NAME": {},
+    "BUCKET_PREFIX_BACKUPS": {},
+    "BUCKET_PREFIX_DB_LOGS": {},
+    "BACKUP_UPLOAD_JOB_LOG_LEVEL": {"default": "INFO", "choices": ("INFO", "DEBUG")},
+    "BACKUP_WORKERS": {"type": int, "default": 4, "min": 1},
+    "BACKUP_COMPRESSION": {"default": "gzip", "choices": ("gzip", "zstd", "none")},
+    "ZSTD_LEVEL": {"type": int, "default": 3, "min": 1},
+    "UPLOAD_PART_SIZE_MB": {"type": int, "default": 64, "min": 5},
+    "UPLOAD_CONCURRENCY": {"type": int, "default": 10, "min": 1},
+    "BACKUP_RETENTION_COUNT": {"type": int, "default": 0, "min": 0},
+}
+
+# Loaded once in main
+config = {}
 
 # Set up logging
 def setup_logging(log_dir):
@@ -36,7 +90,7 @@ def setup_logging(log_dir):
 
     # Create a file handler to log to a file
     file_handler = logging.FileHandler(log_file)
-    fileDebugLevel = getVarValue('BACKUP_UPLOAD_JOB_LOG_LEVEL')
+    fileDebugLevel = config['BACKUP_UPLOAD_JOB_LOG_LEVEL']
     if fileDebugLevel == 'DEBUG':
         file_handler.setLevel(logging.DEBUG)
     else:
@@ -56,22 +110,328 @@ def setup_logging(log_dir):
     logger.addHandler(file_handler)
     logger.addHandler(console_handler)
 
-def upload_files_to_s3(file_path, bucket_name, s3_prefix=""):
-    # Create an S3 client using EC2 metadata authentication
-    s3_client = boto3.client('s3')
+def get_s3_client():
+    global s3Client
+    if s3Client is None:
+        # Create an S3 client using EC2 metadata authentication
+        s3Client = boto3.client('s3')
+    return s3Client
+
+def get_transfer_config():
+    """Multipart settings for the backup uploads, from UPLOAD_PART_SIZE_MB and UPLOAD_CONCURRENCY."""
+    part_size = config['UPLOAD_PART_SIZE_MB'] * 1024 * 1024
+    return TransferConfig(
+        multipart_threshold=part_size,
+        multipart_chunksize=part_size,
+        max_concurrency=config['UPLOAD_CONCURRENCY'],
+        use_threads=True,
+    )
+
+def get_compression(filename):
+    """Returns the compression of a file based on its suffix (gzip, zstd or None)."""
+    for compression, suffix in COMPRESSION_SUFFIXES.items():
+        if filename.endswith(suffix):
+            return compression
+    return None
+
+def create_decompressor(compression):
+    if compression == "zstd":
+        if zstandard is None:
+            raise RuntimeError("The zstandard package is needed to read zstd compressed backups.")
+        return zstandard.ZstdDecompressor().decompressobj()
+    return zlib.decompressobj(16 + zlib.MAX_WBITS)
+
+def create_compressor(compression):
+    if compression == "zstd":
+        return zstandard.ZstdCompressor(level=config['ZSTD_LEVEL']).compressobj()
+    return zlib.compressobj(6, zlib.DEFLATED, 16 + zlib.MAX_WBITS)
+
+def get_upload_compression():
+    """Returns the compression to apply to uncompressed backups (BACKUP_COMPRESSION), None for none."""
+    compression = config['BACKUP_COMPRESSION']
+    if compression == 'none':
+        return None
+    if compression == 'zstd' and zstandard is None:
+        logging.warning("WARNING: zstandard is not installed, compressing the backup with gzip instead.")
+        return 'gzip'
+    return compression
+
+def read_binlog_coordinates(stream, compression, max_bytes=64 * 1024 * 1024):
+    """
+    Reads the head of a dump until the CHANGE MASTER TO line is found.
+
+    :param compression: Compression of the stream (gzip, zstd or None)
+    :return: Binary log file and position, or (None, None) if the dump has none
+    """
+    decompressor = create_decompressor(compression)
+    data = b""
+    scanned = 0
+    while scanned < max_bytes:
+        chunk = stream.read(64 * 1024)
+        if not chunk:
+            break
+        if compression:
+            # Backups may contain multiple gzip members / zstd frames
+            if decompressor.eof:
+                decompressor = create_decompressor(compression)
+            chunk = decompressor.decompress(chunk)
+        scanned += len(chunk)
+        data = data[-4096:] + chunk
+        match = CHANGE_MASTER_PATTERN.search(data)
+        if match:
+            return match.group(1).decode("utf-8"), int(match.group(2))
+    return None, None
+
+
+def get_backup_creation_time(filename, fallback):
+    """Returns the creation time (UTC, ISO 8601) from the backup file name, or the fallback datetime."""
+    match = BACKUP_NAME_PATTERN.search(filename)
+    if match:
+        created = datetime.strptime(match.group(1), "%Y%m%d_%H%M%S_%z")
+    else:
+        created = fallback
+    return created.astimezone(timezone.utc).strftime("%Y-%m-%dT%H:%M:%SZ")
+
+
+def read_backup_catalog_version(s3_client, bucket_name, s3_prefix):
+    """Reads the catalog and its ETag (None when there is no catalog yet)."""
+    catalog_key = str(Path(s3_prefix) / CATALOG_FILE_NAME)
+    try:
+        response = s3_client.get_object(Bucket=bucket_name, Key=catalog_key)
+        return json.loads(response["Body"].read()), response["ETag"]
+    except ClientError as e:
+        if e.response["Error"]["Code"] == "NoSuchKey":
+            return {"backups": []}, None
+        raise
+
+
+def read_backup_catalog(s3_client, bucket_name, s3_prefix):
+    return read_backup_catalog_version(s3_client, bucket_name, s3_prefix)[0]
+
+
+def write_backup_catalog(s3_client, bucket_name, s3_prefix, catalog, etag):
+    """
+    Writes the catalog only if it is still the version that was read (etag), or still missing
+    when etag is None. Raises a PreconditionFailed ClientError when another run changed it.
+    """
+    catalog_key = str(Path(s3_prefix) / CATALOG_FILE_NAME)
+    condition = {"IfMatch": etag} if etag else {"IfNoneMatch": "*"}
+    s3_client.put_object(
+        Bucket=bucket_name,
+        Key=catalog_key,
+        Body=json.dumps(catalog, indent=2).encode("utf-8"),
+        ContentType="application/json",
+        **condition,
+    )
+    logging.info(f"Updated backup catalog s3://{bucket_name}/{catalog_key} ({len(catalog['backups'])} backups)")
+
+
+def modify_backup_catalog(s3_client, bucket_name, s3_prefix, change):
+    """
+    Applies change (a function editing the catalog in place) with a conditional write.
+    When another run (e.g. a parallel backup next to a file upload) updated the catalog in
+    between, the catalog is read again and change is reapplied, so no run loses the entries
+    of another.
+    """
+    for attempt in range(1, CATALOG_UPDATE_ATTEMPTS + 1):
+        catalog, etag = read_backup_catalog_version(s3_client, bucket_name, s3_prefix)
+        change(catalog)
+        try:
+            write_backup_catalog(s3_client, bucket_name, s3_prefix, catalog, etag)
+            return catalog
+        except ClientError as e:
+            code = e.response["Error"]["Code"]
+            if code not in ("PreconditionFailed", "ConditionalRequestConflict") or attempt == CATALOG_UPDATE_ATTEMPTS:
+                raise
+            logging.info(f"The backup catalog was changed by another run, retrying the update ({attempt}/{CATALOG_UPDATE_ATTEMPTS})...")
+            time.sleep(random.uniform(0, 0.2 * 2 ** attempt))
+
+
+def add_to_backup_catalog(catalog, entry):
+    """Inserts (or replaces) a backup entry, keeping the catalog sorted by creation time."""
+    backups = [b for b in catalog["backups"] if b["key"] != entry["key"]]
+    created = [b["created"] for b in backups]
+    backups.insert(bisect.bisect_right(created, entry["created"]), entry)
+    catalog["backups"] = backups
+
+
+def update_backup_catalog(s3_client, bucket_name, s3_prefix, entry):
+    """Records an uploaded backup (key, creation time, binlog coordinates, size and checksum) in the catalog."""
+    if not entry["binlog_file"]:
+        logging.warning(f"WARNING: No CHANGE MASTER TO line found in {entry['key']}.")
+    modify_backup_catalog(s3_client, bucket_name, s3_prefix, lambda catalog: add_to_backup_catalog(catalog, entry))
+
+
+class UploadStreamReader:
+    """
+    Read-only file object fed to upload_fileobj. It compresses the source stream on the fly
+    (unless compression is None), computes the SHA-256 of the uploaded bytes and picks up
+    the CHANGE MASTER TO line from the uncompressed dump header while it passes through.
+    """
+
+    SCAN_LIMIT = 64 * 1024 * 1024
+    # Last line mysqldump writes once the dump is complete
+    DUMP_COMPLETED_MARKER = b"-- Dump completed"
+
+    def __init__(self, source, compression=None, check_completed=False):
+        self.source = source
+        # Fail the upload (so that it is aborted) if the dump is truncated, e.g. mysqldump failed mid-way
+        self.check_completed = check_completed
+        self.tail = b""
+        self.compressor = create_compressor(compression) if compression else None
+        self.sha256 = hashlib.sha256()
+        self.buffer = bytearray()
+        self.finished = False
+        self.bytes_in = 0
+        self.bytes_out = 0
+        self.binlog_file = None
+        self.binlog_position = None
+        self.scan_data = b""
+
+    def _scan(self, chunk):
+        if self.binlog_file or self.bytes_in > self.SCAN_LIMIT:
+            return
+        self.scan_data = self.scan_data[-4096:] + chunk
+        match = CHANGE_MASTER_PATTERN.search(self.scan_data)
+        if match:
+            self.binlog_file, self.binlog_position = match.group(1).decode("utf-8"), int(match.group(2))
+
+    def read(self, size=-1):
+        while not self.finished and (size < 0 or len(self.buffer) < size):
+            chunk = self.source.read(1024 * 1024)
+            if not chunk:
+                self.finished = True
+                if self.check_completed and self.DUMP_COMPLETED_MARKER not in self.tail:
+                    raise RuntimeError("The dump is incomplete (no '-- Dump completed' line at its end).")
+                if self.compressor:
+                    self.buffer += self.compressor.flush()
+                break
+            self.bytes_in += len(chunk)
+            self.tail = (self.tail + chunk)[-4096:]
+            self._scan(chunk)
+            if self.compressor:
+                chunk = self.compressor.compress(chunk)
+            self.buffer += chunk
+        if size < 0:
+            size = len(self.buffer)
+        data = bytes(self.buffer[:size])
+        del self.buffer[:size]
+        self.sha256.update(data)
+        self.bytes_out += len(data)
+        return data
+
+
+def rebuild_backup_catalog(bucket_name, s3_prefix):
+    """Recreates the catalog from the backups already in S3 (e.g. the ones uploaded before the catalog existed)."""
+    s3_client = get_s3_client()
+    # Checksums can't be recomputed without downloading the backups, keep the known ones
+    known = read_backup_catalog(s3_client, bucket_name, s3_prefix)["backups"]
+    checksums = {b["key"]: b["sha256"] for b in known if b.get("sha256")}
+    catalog = {"backups": []}
+
+    paginator = s3_client.get_paginator("list_objects_v2")
+    for page in paginator.paginate(Bucket=bucket_name, Prefix=s3_prefix):
+        for obj in page.get("Contents", []):
+            s3_key = obj["Key"]
+            if s3_key.endswith("/") or s3_key.endswith(CATALOG_FILE_NAME):
+                continue
+            if "/" in s3_key[len(s3_prefix):].strip("/"):
+                # Parallel backups are recorded through their manifest, skip their chunks
+                if s3_key.endswith(MANIFEST_FILE_NAME):
+                    logging.info(f"Adding s3://{bucket_name}/{s3_key} to the catalog")
+                    manifest = json.loads(s3_client.get_object(Bucket=bucket_name, Key=s3_key)["Body"].read())
+                    add_to_backup_catalog(catalog, get_manifest_catalog_entry(s3_key, manifest))
+                continue
+            logging.info(f"Adding s3://{bucket_name}/{s3_key} to the catalog")
+            body = s3_client.get_object(Bucket=bucket_name, Key=s3_key)["Body"]
+            try:
+                binlog_file, binlog_position = read_binlog_coordinates(body, get_compression(s3_key))
+            finally:
+                body.close()
+            add_to_backup_catalog(catalog, {
+                "key": s3_key,
+                "created": get_backup_creation_time(Path(s3_key).name, obj["LastModified"]),
+                "binlog_file": binlog_file,
+                "binlog_position": binlog_position,
+                "size": obj["Size"],
+                "sha256": checksums.get(s3_key),
+            })
+
+    def replace_catalog(current):
+        # Keep the entries other runs added while the prefix was being listed
+        known_keys = {b["key"] for b in known}
+        added = [b for b in current["backups"] if b["key"] not in known_keys]
+        current["backups"] = list(catalog["backups"])
+        for entry in added:
+            add_to_backup_catalog(current, entry)
+
+    modify_backup_catalog(s3_client, bucket_name, s3_prefix, replace_catalog)
+
+def upload_files_to_s3(file_path, bucket_name, s3_prefix="", name=None):
+    """
+    Uploads a backup with the tuned multipart settings and records it in the catalog.
+    Uncompressed input (a .sql file, or mysqldump output on stdin when file_path is '-')
+    is compressed on the fly with BACKUP_COMPRESSION, so the uncompressed dump never has to
+    be written to disk. S3 verifies a SHA-256 checksum of every part, and the SHA-256 of
+    the whole object is stored in the catalog.
 
+    :param name: File name of the backup in S3, required when reading from stdin
+    """
+    s3_client = get_s3_client()
+
+    from_stdin = str(file_path) == '-'
     file_path = Path(file_path)
-    filename = Path(file_path).name
+    filename = name or file_path.name
 
     try:
-        if file_path.is_file():  # Process files only
+        if from_stdin or file_path.is_file():
+            compression = get_compression(filename)
+            if compression:
+                # Already compressed, upload as is
+                new_compression = None
+            else:
+                new_compression = get_upload_compression()
+                if new_compression:
+                    filename += COMPRESSION_SUFFIXES[new_compression]
+
             # Create the full S3 path, including the optional prefix
             s3_key = str(Path(s3_prefix) / filename)
 
-            # Upload the file if it's modified or doesn't exist on S3
-            logging.info(f"Uploading {file_path} to s3://{bucket_name}/{s3_key}")
-            s3_client.upload_file(str(file_path), bucket_name, s3_key)
-            logging.info(f"Successfully uploaded {file_path} to s3://{bucket_name}/{s3_key}")
+            logging.info(f"Uploading {'stdin' if from_stdin else file_path} to s3://{bucket_name}/{s3_key}")
+            start = time.monotonic()
+            source = sys.stdin.buffer if from_stdin else open(file_path, "rb")
+            try:
+                reader = UploadStreamReader(source, new_compression, check_completed=from_stdin and not compression)
+                s3_client.upload_fileobj(
+                    reader,
+                    bucket_name,
+                    s3_key,
+                    ExtraArgs={"ChecksumAlgorithm": "SHA256"},
+                    Config=get_transfer_config(),
+                )
+            finally:
+                source.close()
+            seconds = time.monotonic() - start
+            logging.info(
+                f"Successfully uploaded {reader.bytes_out} bytes ({reader.bytes_in} bytes read) to s3://{bucket_name}/{s3_key} in {seconds:.1f}s"
+            )
+
+            try:
+                binlog_file, binlog_position = reader.binlog_file, reader.binlog_position
+                if not new_compression and not from_stdin:
+                    with open(file_path, "rb") as f:
+                        binlog_file, binlog_position = read_binlog_coordinates(f, compression)
+                fallback = datetime.now(timezone.utc) if from_stdin else datetime.fromtimestamp(file_path.stat().st_mtime, tz=timezone.utc)
+                update_backup_catalog(s3_client, bucket_name, s3_prefix, {
+                    "key": s3_key,
+                    "created": get_backup_creation_time(filename, fallback),
+                    "binlog_file": binlog_file,
+                    "binlog_position": binlog_position,
+                    "size": reader.bytes_out,
+                    "sha256": reader.sha256.hexdigest(),
+                })
+            except Exception as e:
+                logging.error(f"ERROR: Failed to update the backup catalog. Error: {e}")
         else:
             logging.error(f"ERROR: Skipping {file_path}. File does not exist.")
             exit(1)
@@ -80,22 +440,313 @@ def upload_files_to_s3(file_path, bucket_name, s3_prefix=""):
             logging.error(f"ERROR: No credentials found. Make sure the EC2 instance has an IAM role with S3 access.")
     except Exception as e:
         logging.error(f"ERROR: Failed to upload {file_path}. Error: {e}")
+        exit(1)
 
-if __name__ == "__main__":
-    # Check if an argument is provided
-    if len(sys.argv) != 2:
-        logging.error("ERROR: Invalid argument count. Exiting...")
+def get_manifest_catalog_entry(manifest_key, manifest):
+    return {
+        "key": manifest_key,
+        "created": manifest["created"],
+        "binlog_file": manifest["binlog_file"],
+        "binlog_position": manifest["binlog_position"],
+        "size": sum(chunk["size"] for chunk in [manifest["schema"], manifest["post"]] + manifest["tables"]),
+        "format": "parallel",
+    }
+
+def list_tables(db_name):
+    """Returns the base tables of the database, largest first so that they start dumping first."""
+    result = subprocess.run(
+        [
+            "mysql", "--batch", "--skip-column-names", "-e",
+            "SELECT table_name FROM information_schema.tables "
+            f"WHERE table_schema = '{db_name}' AND table_type = 'BASE TABLE' "
+            "ORDER BY data_length + index_length DESC",
+        ],
+        stdout=subprocess.PIPE,
+        check=True,
+        text=True,
+    )
+    return [line for line in result.stdout.splitlines() if line]
+
+def dump_to_s3(command, bucket_name, s3_key, compression):
+    """
+    Streams the output of a mysqldump command to S3, compressing it on the fly.
+
+    :return: The chunk entry of the manifest (key, size and SHA-256)
+    """
+    s3_client = get_s3_client()
+    process = subprocess.Popen(command, stdout=subprocess.PIPE)
+    try:
+        reader = UploadStreamReader(process.stdout, compression, check_completed=True)
+        s3_client.upload_fileobj(
+            reader,
+            bucket_name,
+            s3_key,
+            ExtraArgs={"ChecksumAlgorithm": "SHA256"},
+            Config=get_transfer_config(),
+        )
+    finally:
+        process.stdout.close()
+        if process.wait() != 0:
+            raise RuntimeError(f"mysqldump exit code {process.returncode} for {s3_key}")
+    logging.info(f"Uploaded s3://{bucket_name}/{s3_key} ({reader.bytes_out} bytes)")
+    return {"key": s3_key, "size": reader.bytes_out, "sha256": reader.sha256.hexdigest()}
+
+def delete_backup_prefix(bucket_name, backup_prefix):
+    s3_client = get_s3_client()
+    paginator = s3_client.get_paginator("list_objects_v2")
+    for page in paginator.paginate(Bucket=bucket_name, Prefix=backup_prefix + "/"):
+        keys = [{"Key": obj["Key"]} for obj in page.get("Contents", [])]
+        if keys:
+            s3_client.delete_objects(Bucket=bucket_name, Delete={"Objects": keys, "Quiet": True})
+
+def parallel_dump_to_s3(db_name, bucket_name, s3_prefix, workers):
+    """
+    Dumps the database table by table with a pool of mysqldump workers and uploads every
+    table as it is dumped, under <s3_prefix>/<db>-bak-<timestamp>/. A manifest tying the
+    chunks together is uploaded last and recorded in the backup catalog.
+
+    All dumps run under one global read lock (like the --lock-tables of the single stream
+    dump, writes wait until the backup completes), which makes the chunks consistent
+    with each other and with the binary log coordinates read when the lock is taken.
+    The schema is dumped first, triggers, routines and events last. On GTID enabled
+    servers only the schema chunk sets GTID_PURGED, the other chunks are dumped
+    with --set-gtid-purged=OFF.
+    """
+    compression = get_upload_compression()
+    suffix = ".sql" + COMPRESSION_SUFFIXES.get(compression, "")
+    now = datetime.now().astimezone()
+    backup_prefix = str(Path(s3_prefix) / f"{db_name}-bak-{now.strftime('%Y%m%d_%H%M%S_%z')}")
+    tables = list_tables(db_name)
+
+    # The lock is held by this session until the end of the backup
+    lock_session = subprocess.Popen(
+        ["mysql", "--batch", "--skip-column-names", "--unbuffered"],
+        stdin=subprocess.PIPE,
+        stdout=subprocess.PIPE,
+        text=True,
+    )
+    # SHOW MASTER STATUS returns no row when binary logging is off, the marker ends the
+    # output either way so reading it never waits on the open session
+    lock_session.stdin.write(
+        f"FLUSH TABLES WITH READ LOCK;\nFLUSH LOGS;\nSHOW MASTER STATUS;\nSELECT '{LOCK_SESSION_MARKER}';\n"
+    )
+    lock_session.stdin.flush()
+    master_status = []
+    for line in lock_session.stdout:
+        line = line.rstrip("\n")
+        if line == LOCK_SESSION_MARKER:
+            break
+        if not master_status:
+            master_status = line.split("\t")
+    if len(master_status) < 2:
+        logging.error("ERROR: Could not read the binary log coordinates (is binary logging enabled?).")
+        lock_session.kill()
+        lock_session.wait()
+        exit(1)
+    binlog_file, binlog_position = master_status[0], int(master_status[1])
+    logging.info(
+        f"Dumping {len(tables)} tables of {db_name} with {workers} workers at {binlog_file}:{binlog_position}"
+    )
+
+    start = time.monotonic()
+    try:
+        schema = dump_to_s3(
+            ["mysqldump", "--no-data", "--skip-triggers", "--skip-lock-tables", "--add-drop-database", "--databases", db_name],
+            bucket_name, f"{backup_prefix}/000000-schema{suffix}", compression,
+        )
+        table_chunks = {}
+        with ThreadPoolExecutor(max_workers=workers) as executor:
+            futures = {
+                executor.submit(
+                    dump_to_s3,
+                    ["mysqldump", "--no-create-info", "--skip-triggers", "--skip-lock-tables", "--set-gtid-purged=OFF", db_name, table],
+                    bucket_name, f"{backup_prefix}/{index:06d}-{table}{suffix}", compression,
+                ): table
+                for index, table in enumerate(tables, start=1)
+            }
+            for future in as_completed(futures):
+                table_chunks[futures[future]] = future.result()
+        post = dump_to_s3(
+            ["mysqldump", "--no-data", "--no-create-info", "--skip-lock-tables", "--set-gtid-purged=OFF", "--triggers", "--routines", "--events", db_name],
+            bucket_name, f"{backup_prefix}/{len(tables) + 1:06d}-post{suffix}", compression,
+        )
+    except Exception as e:
+        logging.error(f"ERROR: Parallel backup of {db_name} failed, removing its chunks. Error: {e}")
+        delete_backup_prefix(bucket_name, backup_prefix)
         exit(1)
+    finally:
+        lock_session.stdin.write("UNLOCK TABLES;\n")
+        lock_session.stdin.close()
+        lock_session.wait()
+
+    manifest = {
+        "database": db_name,
+        "created": now.astimezone(timezone.utc).strftime("%Y-%m-%dT%H:%M:%SZ"),
+        "binlog_file": binlog_file,
+        "binlog_position": binlog_position,
+        "compression": compression,
+        "schema": schema,
+        "tables": [{"table": table, **table_chunks[table]} for table in tables],
+        "post": post,
+    }
+    manifest_key = f"{backup_prefix}/{MANIFEST_FILE_NAME}"
+    s3_client = get_s3_client()
+    s3_client.put_object(
+        Bucket=bucket_name,
+        Key=manifest_key,
+        Body=json.dumps(manifest, indent=2).encode("utf-8"),
+        ContentType="application/json",
+    )
+    logging.info(f"Parallel backup of {db_name} completed in {time.monotonic() - start:.1f}s: s3://{bucket_name}/{manifest_key}")
+    try:
+        update_backup_catalog(s3_client, bucket_name, s3_prefix, get_manifest_catalog_entry(manifest_key, manifest))
+    except Exception as e:
+        logging.error(f"ERROR: Failed to update the backup catalog. Error: {e}")
+
+def delete_s3_keys(bucket_name, keys, dry_run=False):
+    """Deletes the keys with batched delete_objects calls (up to 1000 keys per call)."""
+    s3_client = get_s3_client()
+    failed = 0
+    for start in range(0, len(keys), 1000):
+        batch = keys[start:start + 1000]
+        if dry_run:
+            for key in batch:
+                logging.info(f"Would delete s3://{bucket_name}/{key}")
+            continue
+        response = s3_client.delete_objects(
+            Bucket=bucket_name,
+            Delete={"Objects": [{"Key": key} for key in batch], "Quiet": True},
+        )
+        for error in response.get("Errors", []):
+            logging.error(f"ERROR: Failed to delete s3://{bucket_name}/{error['Key']}. Error: {error['Message']}")
+            failed += 1
+    return failed
+
+def binlog_sequence(filename):
+    """Numeric suffix of a binary log file name (mysql-bin.000042 -> 42), names don't sort past .999999."""
+    suffix = os.path.splitext(filename)[1][1:]
+    return int(suffix) if suffix.isdigit() else None
+
+def list_obsolete_binlogs(bucket_name, logs_prefix, first_needed_log):
+    """
+    Lists the binary logs older than first_needed_log. Logs are compared by their numeric
+    suffix, as key order puts .1000000 before .999999.
+    """
+    s3_client = get_s3_client()
+    base_name = first_needed_log.rsplit(".", 1)[0]
+    first_needed = binlog_sequence(first_needed_log)
+    keys = []
+    paginator = s3_client.get_paginator("list_objects_v2")
+    for page in paginator.paginate(Bucket=bucket_name, Prefix=str(Path(logs_prefix) / base_name) + "."):
+        for obj in page.get("Contents", []):
+            sequence = binlog_sequence(obj["Key"])
+            if sequence is not None and sequence < first_needed:
+                keys.append(obj["Key"])
+    return keys
+
+def apply_retention(bucket_name, backups_prefix, logs_prefix, keep, dry_run=False):
+    """
+    Keeps the newest keep full backups of the catalog and the binary logs needed to restore
+    to any point in time since the oldest of them, everything older is deleted.
+    The backups are removed from the catalog before their objects are deleted, so a
+    restore never picks a backup that is being deleted.
+    """
+    s3_client = get_s3_client()
+    catalog = read_backup_catalog(s3_client, bucket_name, backups_prefix)
+    backups = catalog["backups"]
+    if len(backups) <= keep:
+        logging.info(f"{len(backups)} backups in the catalog, nothing to prune (keeping {keep}).")
+        return
+
+    expired, kept = backups[:-keep], backups[-keep:]
+    keys = []
+    for backup in expired:
+        if backup.get("format") == "parallel":
+            manifest = json.loads(s3_client.get_object(Bucket=bucket_name, Key=backup["key"])["Body"].read())
+            keys += [chunk["key"] for chunk in [manifest["schema"], manifest["post"]] + manifest["tables"]]
+        keys.append(backup["key"])
+
+    first_needed_log = kept[0].get("binlog_file")
+    if first_needed_log:
+        log_keys = list_obsolete_binlogs(bucket_name, logs_prefix, first_needed_log)
     else:
-        backupFile = sys.argv[1]  # The second argument is the first user-provided argument
+        logging.warning(
+            f"WARNING: {kept[0]['key']} has no binary log coordinates, binary logs are not pruned."
+        )
+        log_keys = []
+
+    logging.info(
+        f"Pruning {len(expired)} backups ({len(keys)} objects) and {len(log_keys)} binary logs older than {first_needed_log}, keeping {keep} backups."
+    )
+    if not dry_run:
+        # Only the expired entries are removed, backups added by other runs in the meantime are kept
+        expired_keys = {backup["key"] for backup in expired}
+        def remove_expired(current):
+            current["backups"] = [b for b in current["backups"] if b["key"] not in expired_keys]
+        modify_backup_catalog(s3_client, bucket_name, backups_prefix, remove_expired)
+    failed = delete_s3_keys(bucket_name, keys + log_keys, dry_run)
+    if failed:
+        logging.error(f"ERROR: {failed} objects could not be deleted.")
+        exit(1)
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument(
+        "backup_file",
+        nargs="?",
+        help="Backup file to upload, or '-' to read the dump from stdin (e.g. piped from mysqldump)",
+    )
+    parser.add_argument("--name", help="File name of the backup in S3 (required when reading from stdin)")
+    parser.add_argument(
+        "--parallel-dump",
+        action="store_true",
+        help="Dump the database table by table with BACKUP_WORKERS workers and upload the tables as they are dumped",
+    )
+    parser.add_argument(
+        "--apply-retention",
+        action="store_true",
+        help="Keep the newest BACKUP_RETENTION_COUNT backups and the binary logs they need, delete the rest",
+    )
+    parser.add_argument(
+        "--dry-run",
+        action="store_true",
+        help="With --apply-retention, only log what would be deleted",
+    )
+    parser.add_argument(
+        "--rebuild-catalog",
+        action="store_true",
+        help="Recreate the backup catalog from the backups already in S3",
+    )
+    args = parser.parse_args()
+    if not (args.rebuild_catalog or args.parallel_dump or args.apply_retention) and (not args.backup_file or (args.backup_file == '-' and not args.name)):
+        logging.error("ERROR: Invalid arguments. Exiting...")
+        exit(1)
 
     varFile = "variables.txt"
+    try:
+        config = load_config(varFile, CONFIG_SPEC)
+    except ConfigError as e:
+        logging.error(f"ERROR: {e}. Exiting...")
+        exit(1)
 
-    logDir = getVarValue('SCRIPT_LOG_DIR')
+    logDir = config['SCRIPT_LOG_DIR']
     setup_logging(logDir)
+    log_env_overrides(CONFIG_SPEC)
 
-    backupDirectory = getVarValue('BACKUP_DIR')
-    bucketName = getVarValue('BUCKET_NAME')
-    s3Prefix = getVarValue('BUCKET_PREFIX_BACKUPS')
-    upload_files_to_s3(backupFile, bucketName, s3Prefix)
-
+    backupDirectory = config['BACKUP_DIR']
+    bucketName = config['BUCKET_NAME']
+    s3Prefix = config['BUCKET_PREFIX_BACKUPS']
+    if args.rebuild_catalog:
+        rebuild_backup_catalog(bucketName, s3Prefix)
+    elif args.apply_retention:
+        keep = config['BACKUP_RETENTION_COUNT']
+        if keep < 1:
+            logging.error("ERROR: BACKUP_RETENTION_COUNT must be at least 1. Exiting...")
+            exit(1)
+        apply_retention(bucketName, s3Prefix, config['BUCKET_PREFIX_DB_LOGS'], keep, args.dry_run)
+    elif args.parallel_dump:
+        parallel_dump_to_s3(
+            config['DB_NAME'], bucketName, s3Prefix, config['BACKUP_WORKERS']
+        )
+    else:
+        upload_files_to_s3(args.backup_file, bucketName, s3Prefix, name=args.name)
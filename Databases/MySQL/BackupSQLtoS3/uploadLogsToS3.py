@@ -1,23 +1,45 @@
 import boto3
 import os
 from pathlib import Path
-from botocore.exceptions import NoCredentialsError, ClientError
+from botocore.exceptions import NoCredentialsError
 import time
 from datetime import datetime
 import logging
+import json
+import sys
+import struct
+import glob
+import argparse
+from concurrent.futures import ThreadPoolExecutor, as_completed
 
-def getVarValue(varKey):
-    varValue = None
-    with open(varFile, 'r') as file:
-        for line in file:
-            if line.startswith(varKey + '='):
-                varValue = line.strip().split('=')[1]
-                break
+# scriptConfig.py is shared by the MySQL scripts and lives one directory up. A copy next to
+# this script takes precedence, for deployments of this folder on its own
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+from scriptConfig import load_config, log_env_overrides, ConfigError
 
-    if not varValue:
-        raise ValueError( varKey + " not found in " + varFile)
-    else:
-        return varValue
+# State file (in SCRIPT_LOG_DIR) with the size and mtime of every log already shipped
+STATE_FILE_NAME = "uploadedLogs.json"
+# Binary log format: 4 byte magic number, then events with a 19 byte header (event size at offset 9)
+BINLOG_MAGIC_SIZE = 4
+BINLOG_EVENT_HEADER_SIZE = 19
+# Minimum size of a multipart upload part other than the last one
+MIN_PART_SIZE = 5 * 1024 * 1024
+
+# Variables of variables.txt used by this script
+CONFIG_SPEC = {
+    "SCRIPT_LOG_DIR": {},
+    "DB_LOG_DIR": {},
+    "BUCKET_NAME": {},
+    "BUCKET_PREFIX_DB_LOGS": {},
+    "LOG_UPLOAD_JOB_LOG_LEVEL": {"default": "INFO", "choices": ("INFO", "DEBUG")},
+    "LOG_UPLOAD_STATE_FILE": {"default": None},
+    "LOG_UPLOAD_WORKERS": {"type": int, "default": 4, "min": 1},
+    "LOG_WATCH_INTERVAL": {"type": float, "default": 5.0, "min": 0.1},
+    "BINLOG_INDEX_FILE": {"default": None},
+}
+
+# Loaded once in main
+config = {}
 
 # Set up logging
 def setup_logging(log_dir):
@@ -35,7 +57,7 @@ def setup_logging(log_dir):
 
     # Create a file handler to log to a file
     file_handler = logging.FileHandler(log_file)
-    fileDebugLevel = getVarValue('LOG_UPLOAD_JOB_LOG_LEVEL')
+    fileDebugLevel = config['LOG_UPLOAD_JOB_LOG_LEVEL']
     if fileDebugLevel == 'DEBUG':
         file_handler.setLevel(logging.DEBUG)
     else:
@@ -55,59 +77,295 @@ def setup_logging(log_dir):
     logger.addHandler(file_handler)
     logger.addHandler(console_handler)
 
-def upload_files_to_s3(local_directory, bucket_name, s3_prefix=""):
+def load_upload_state(state_file):
+    if os.path.isfile(state_file):
+        with open(state_file, 'r') as f:
+            return json.load(f)
+    return {}
+
+def save_upload_state(state_file, state):
+    temp_file = state_file + '.tmp'
+    with open(temp_file, 'w') as f:
+        json.dump(state, f, indent=2)
+    os.replace(temp_file, state_file)
+
+def list_s3_objects(s3_client, bucket_name, s3_prefix):
+    """
+    Lists the prefix once.
+
+    :return: Dict of S3 key to (size, LastModified as a Unix timestamp)
+    """
+    objects = {}
+    paginator = s3_client.get_paginator('list_objects_v2')
+    for page in paginator.paginate(Bucket=bucket_name, Prefix=s3_prefix):
+        for obj in page.get('Contents', []):
+            objects[obj['Key']] = (obj['Size'], obj['LastModified'].timestamp())
+    return objects
+
+def upload_files_to_s3(local_directory, bucket_name, s3_prefix="", state_file=None, workers=4):
+    """
+    Uploads the new or grown files of local_directory to S3.
+    Files recorded in the state file with their current size and mtime are skipped without
+    any S3 request, the rest are compared against a single listing of the prefix and the
+    changed ones are uploaded concurrently.
+
+    :param state_file: Path of the state file of shipped logs (None to always compare against S3)
+    :param workers: Number of concurrent uploads
+    """
     # Create an S3 client using EC2 metadata authentication
     s3_client = boto3.client('s3')
 
     # Convert local_directory to a Path object
     local_directory = Path(local_directory)
+    state = load_upload_state(state_file) if state_file else {}
 
     # Loop over all files in the directory using pathlib.rglob() for recursive traversal
+    local_files = {}
     for file_path in local_directory.rglob('*'):
         if file_path.is_file():  # Process files only
             # Create the full S3 path, including the optional prefix
             relative_path = file_path.relative_to(local_directory)
             s3_key = str(Path(s3_prefix) / relative_path).replace(os.sep, "/")
+            stat = file_path.stat()
+            local_files[s3_key] = (file_path, stat.st_size, stat.st_mtime)
 
+    # Forget logs that were purged locally
+    state = {s3_key: shipped for s3_key, shipped in state.items() if s3_key in local_files}
+
+    candidates = []
+    for s3_key, (file_path, size, mtime) in local_files.items():
+        shipped = state.get(s3_key)
+        if shipped and shipped['size'] == size and shipped['mtime'] == mtime:
+            logging.debug(f"Skipping {file_path}. Already shipped.")
+        else:
+            candidates.append(s3_key)
+
+    to_upload = []
+    if candidates:
+        try:
+            s3_objects = list_s3_objects(s3_client, bucket_name, s3_prefix)
+        except NoCredentialsError:
+            logging.error(f"ERROR: No credentials found. Make sure the EC2 instance has an IAM role with S3 access.")
+            return
+        for s3_key in candidates:
+            file_path, size, mtime = local_files[s3_key]
+            s3_object = s3_objects.get(s3_key)
+            # Upload the file if it doesn't exist on S3, has grown or was modified since the last upload
+            # (LastModified has a one second resolution)
+            if s3_object is None or s3_object[0] != size or int(mtime) > s3_object[1]:
+                to_upload.append(s3_key)
+            else:
+                logging.info(f"Skipping {file_path}. No modification since the last upload.")
+                state[s3_key] = {'size': size, 'mtime': mtime}
+
+    def upload(s3_key):
+        file_path = local_files[s3_key][0]
+        logging.info(f"Uploading {file_path} to s3://{bucket_name}/{s3_key}")
+        s3_client.upload_file(str(file_path), bucket_name, s3_key)
+        logging.info(f"Successfully uploaded {file_path} to s3://{bucket_name}/{s3_key}")
+
+    if to_upload:
+        logging.info(f"Uploading {len(to_upload)} of {len(local_files)} files.")
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        futures = {executor.submit(upload, s3_key): s3_key for s3_key in to_upload}
+        for future in as_completed(futures):
+            s3_key = futures[future]
+            file_path, size, mtime = local_files[s3_key]
             try:
-                # Check if the file exists on S3 and get the LastModified timestamp
+                future.result()
+                # Record the size/mtime seen before the upload, a log that grew meanwhile is shipped again on the next run
+                state[s3_key] = {'size': size, 'mtime': mtime}
+            except NoCredentialsError:
+                logging.error(f"ERROR: No credentials found. Make sure the EC2 instance has an IAM role with S3 access.")
+            except Exception as e:
+                logging.error(f"ERROR: Failed to upload {file_path}. Error: {e}")
+
+    if state_file:
+        save_upload_state(state_file, state)
+
+
+def read_binlog_index(index_file, log_dir):
+    """Returns the paths of the binary logs listed in the binlog index, oldest first."""
+    with open(index_file, 'r') as f:
+        return [os.path.join(log_dir, os.path.basename(line.strip())) for line in f if line.strip()]
+
+def find_complete_events_end(file_path, offset, size):
+    """
+    Walks the event headers of a binary log from offset.
+
+    :return: Offset of the end of the last complete event before size
+    """
+    offset = max(offset, BINLOG_MAGIC_SIZE)
+    with open(file_path, 'rb') as f:
+        while offset + BINLOG_EVENT_HEADER_SIZE <= size:
+            f.seek(offset)
+            event_size = struct.unpack_from('<I', f.read(BINLOG_EVENT_HEADER_SIZE), 9)[0]
+            if event_size < BINLOG_EVENT_HEADER_SIZE or offset + event_size > size:
+                break
+            offset += event_size
+    return offset
+
+class BinlogShipper:
+    """
+    Long-running shipper: polls the binlog index, uploads a binary log as soon as MySQL
+    rotates it and keeps the S3 copy of the active binary log up to date with its
+    complete events.
+    The active log is extended on S3 with a multipart upload that copies the already
+    published part server side (upload_part_copy) and only sends the new bytes.
+    """
+
+    def __init__(self, log_dir, index_file, bucket_name, s3_prefix, state_file):
+        self.s3_client = boto3.client('s3')
+        self.log_dir = log_dir
+        self.index_file = index_file
+        self.bucket_name = bucket_name
+        self.s3_prefix = s3_prefix
+        self.state_file = state_file
+        self.state = load_upload_state(state_file)
+        # Bytes of each log already on S3, and the end of its last complete event
+        self.published = {}
+        self.events_end = {}
+        # (size, mtime) of the active log when it was last shipped
+        self.active_seen = {}
+
+        # Seed from S3 once, so that logs shipped by the batch mode are not uploaded again
+        for s3_key, (size, _) in list_s3_objects(self.s3_client, bucket_name, s3_prefix).items():
+            self.published[s3_key] = size
+
+    def s3_key(self, file_path):
+        return str(Path(self.s3_prefix) / os.path.basename(file_path)).replace(os.sep, "/")
+
+    def publish(self, file_path, end):
+        """Makes the first end bytes of the log the content of its S3 object."""
+        s3_key = self.s3_key(file_path)
+        published = self.published.get(s3_key, 0)
+        with open(file_path, 'rb') as f:
+            if published < MIN_PART_SIZE or published > end:
+                self.s3_client.put_object(Bucket=self.bucket_name, Key=s3_key, Body=f.read(end))
+            else:
+                f.seek(published)
+                upload_id = self.s3_client.create_multipart_upload(Bucket=self.bucket_name, Key=s3_key)['UploadId']
                 try:
-                    response = s3_client.head_object(Bucket=bucket_name, Key=s3_key)
-                    s3_last_modified = response['LastModified'].timestamp()  # Convert to Unix timestamp
-                except ClientError as e:
-                    if e.response['Error']['Message'] == 'Forbidden' or e.response['Error']['Code'] == '404':
-                        # The file doesn't exist on S3, so we need to upload it
-                        s3_last_modified = None
-                    else:
-                        # Handle other errors from S3
-                        raise
-
-                # Get the local file's last modified timestamp
-                local_last_modified = file_path.stat().st_mtime  # This is a Unix timestamp
-
-                # Check if the local file is newer or if the file doesn't exist on S3
-                if s3_last_modified is None or local_last_modified > s3_last_modified:
-                    # Upload the file if it's modified or doesn't exist on S3
-                    logging.info(f"Uploading {file_path} to s3://{bucket_name}/{s3_key}")
-                    s3_client.upload_file(str(file_path), bucket_name, s3_key)
-                    logging.info(f"Successfully uploaded {file_path} to s3://{bucket_name}/{s3_key}")
-                else:
-                    logging.info(f"Skipping {file_path}. No modification since the last upload.")
+                    copied = self.s3_client.upload_part_copy(
+                        Bucket=self.bucket_name,
+                        Key=s3_key,
+                        UploadId=upload_id,
+                        PartNumber=1,
+                        CopySource={'Bucket': self.bucket_name, 'Key': s3_key},
+                        CopySourceRange=f"bytes=0-{published - 1}",
+                    )
+                    appended = self.s3_client.upload_part(
+                        Bucket=self.bucket_name,
+                        Key=s3_key,
+                        UploadId=upload_id,
+                        PartNumber=2,
+                        Body=f.read(end - published),
+                    )
+                    self.s3_client.complete_multipart_upload(
+                        Bucket=self.bucket_name,
+                        Key=s3_key,
+                        UploadId=upload_id,
+                        MultipartUpload={'Parts': [
+                            {'PartNumber': 1, 'ETag': copied['CopyPartResult']['ETag']},
+                            {'PartNumber': 2, 'ETag': appended['ETag']},
+                        ]},
+                    )
+                except Exception:
+                    self.s3_client.abort_multipart_upload(Bucket=self.bucket_name, Key=s3_key, UploadId=upload_id)
+                    raise
+        self.published[s3_key] = end
+        logging.debug(f"Published {end} bytes of {file_path} to s3://{self.bucket_name}/{s3_key}")
+
+    def ship_rotated(self, file_path):
+        s3_key = self.s3_key(file_path)
+        stat = os.stat(file_path)
+        if self.published.get(s3_key) != stat.st_size:
+            logging.info(f"Uploading rotated log {file_path} to s3://{self.bucket_name}/{s3_key}")
+            self.publish(file_path, stat.st_size)
+        self.state[s3_key] = {'size': stat.st_size, 'mtime': stat.st_mtime}
+        save_upload_state(self.state_file, self.state)
+        self.events_end.pop(file_path, None)
+
+    def ship_active(self, file_path):
+        s3_key = self.s3_key(file_path)
+        stat = os.stat(file_path)
+        if self.active_seen.get(file_path) == (stat.st_size, stat.st_mtime):
+            return
+        end = find_complete_events_end(file_path, self.events_end.get(file_path, 0), stat.st_size)
+        self.events_end[file_path] = end
+        if end > self.published.get(s3_key, 0):
+            self.publish(file_path, end)
+        self.active_seen[file_path] = (stat.st_size, stat.st_mtime)
+
+    def is_shipped(self, file_path):
+        """
+        Checks whether the state records the log at its current size and mtime, as the batch mode
+        does. The batch mode also records the active log at its partial size, so a log that is in the
+        state is not shipped yet if it grew before it was rotated.
+        """
+        shipped = self.state.get(self.s3_key(file_path))
+        stat = os.stat(file_path)
+        return shipped is not None and shipped['size'] == stat.st_size and shipped['mtime'] == stat.st_mtime
 
+    def poll(self):
+        logs = read_binlog_index(self.index_file, self.log_dir)
+        if not logs:
+            return
+        for file_path in logs[:-1]:
+            if os.path.isfile(file_path) and not self.is_shipped(file_path):
+                self.ship_rotated(file_path)
+                self.active_seen.pop(file_path, None)
+        self.ship_active(logs[-1])
+
+    def run(self, interval):
+        logging.info(f"Shipping binary logs listed in {self.index_file} every {interval} seconds.")
+        while True:
+            try:
+                self.poll()
             except NoCredentialsError:
                 logging.error(f"ERROR: No credentials found. Make sure the EC2 instance has an IAM role with S3 access.")
             except Exception as e:
-                logging.error(f"ERROR: Failed to upload {file_path}. Error: {e}")
+                logging.error(f"ERROR: Failed to ship binary logs. Error: {e}")
+            time.sleep(interval)
 
 
 if __name__ == "__main__":
     varFile = "variables.txt"
+    try:
+        config = load_config(varFile, CONFIG_SPEC)
+    except ConfigError as e:
+        logging.error(f"ERROR: {e}. Exiting...")
+        exit(1)
 
-    logDir = getVarValue('SCRIPT_LOG_DIR')
+    logDir = config['SCRIPT_LOG_DIR']
     setup_logging(logDir)
+    log_env_overrides(CONFIG_SPEC)
 
-    backupDirectory = getVarValue('DB_LOG_DIR')
-    bucketName = getVarValue('BUCKET_NAME')
-    s3Prefix = getVarValue('BUCKET_PREFIX_DB_LOGS')
-    upload_files_to_s3(backupDirectory, bucketName, s3Prefix)
+    parser = argparse.ArgumentParser()
+    parser.add_argument(
+        "--watch",
+        action="store_true",
+        help="Keep running and ship binary logs as they are written instead of a single sweep",
+    )
+    args = parser.parse_args()
 
+    backupDirectory = config['DB_LOG_DIR']
+    bucketName = config['BUCKET_NAME']
+    s3Prefix = config['BUCKET_PREFIX_DB_LOGS']
+    stateFile = config['LOG_UPLOAD_STATE_FILE'] or os.path.join(logDir, STATE_FILE_NAME)
+    if args.watch:
+        indexFiles = glob.glob(os.path.join(backupDirectory, '*.index'))
+        indexFile = config['BINLOG_INDEX_FILE'] or (indexFiles[0] if indexFiles else None)
+        if not indexFile or not os.path.isfile(indexFile):
+            logging.error(f"ERROR: No binlog index found in {backupDirectory}. Set BINLOG_INDEX_FILE in {varFile}.")
+            exit(1)
+        shipper = BinlogShipper(backupDirectory, indexFile, bucketName, s3Prefix, stateFile)
+        shipper.run(config['LOG_WATCH_INTERVAL'])
+    else:
+        upload_files_to_s3(
+            backupDirectory,
+            bucketName,
+            s3Prefix,
+            state_file=stateFile,
+            workers=config['LOG_UPLOAD_WORKERS'],
+        )
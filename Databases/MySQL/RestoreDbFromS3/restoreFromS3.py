@@ -1,4 +1,5 @@
 import boto3
+from boto3.s3.transfer import TransferConfig
 from botocore.exceptions import NoCredentialsError, PartialCredentialsError
 import os
 from datetime import datetime, timezone
@@ -7,24 +8,69 @@ import subprocess
 import re
 from tzlocal import get_localzone
 import glob
+import time
+import zlib
+import json
+import bisect
+import threading
+import shutil
+import argparse
+import atexit
+import sys
+import hashlib
+from concurrent.futures import ThreadPoolExecutor, as_completed
 
+# scriptConfig.py is shared by the MySQL scripts and lives one directory up. A copy next to
+# this script takes precedence, for deployments of this folder on its own
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+from scriptConfig import load_config, log_env_overrides, ConfigError
 
-def getVarValue(varKey):
-    varValue = None
-    with open(varFile, "r") as file:
-        for line in file:
-            if line.startswith(varKey + "="):
-                varValue = line.strip().split("=")[1]
-                break
+# Optional, only needed to restore zstd compressed backups
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
 
-    if not varValue:
-        raise ValueError(varKey + " not found in " + varFile)
-    else:
-        return varValue
+
+# RESTORE_TIME format, 'YYYY-MM-DD HH:MM:SS +ZZZZ' (the offset can be negative)
+RESTORE_TIME_PATTERN = re.compile(r"(\d{4}-\d{2}-\d{2} \d{2}:\d{2}:\d{2}) ([+-]\d{4})")
+
+
+def validate_restore_time(value):
+    """Checks that RESTORE_TIME has the 'YYYY-MM-DD HH:MM:SS +ZZZZ' format."""
+    if not RESTORE_TIME_PATTERN.fullmatch(value):
+        raise ValueError("expected 'YYYY-MM-DD HH:MM:SS +ZZZZ'")
+    datetime.strptime(value, "%Y-%m-%d %H:%M:%S %z")
+    return value
+
+
+# Variables of variables.txt used by this script
+CONFIG_SPEC = {
+    "SCRIPT_LOG_DIR": {},
+    "DB_NAME": {},
+    "DOWNLOAD_DIR": {},
+    "CURRENT_BACKUP_DIR": {},
+    "BUCKET_NAME": {},
+    "RESTORE_TIME": {"type": validate_restore_time},
+    "FULL_BACKUPS_S3_PREFIX": {},
+    "DB_LOGS_S3_PREFIX": {},
+    "RESTORE_JOB_LOG_LEVEL": {"default": "INFO", "choices": ("INFO", "DEBUG")},
+    "RESTORE_MODE": {"default": "file", "choices": ("file", "stream", "parallel")},
+    "RESTORE_WORKERS": {"type": int, "default": 4, "min": 1},
+    "DOWNLOAD_CONCURRENCY": {"type": int, "default": 10, "min": 1},
+    "DOWNLOAD_PART_SIZE_MB": {"type": int, "default": 64, "min": 5},
+    "LOG_DOWNLOAD_WORKERS": {"type": int, "default": 8, "min": 1},
+    "REPLAY_MODE": {"default": "combined", "choices": ("combined", "pipe")},
+    "CACHE_MAX_SIZE_GB": {"type": float, "default": 0.0, "min": 0},
+    "CACHE_DIR": {"default": None},
+}
+
+# Loaded once in main
+config = {}
 
 def convertTimeToSystemNative(time):
 
-    match = re.search(r"(\d{4}-\d{2}-\d{2} \d{2}:\d{2}:\d{2}) (\+\d{4})", time)
+    match = RESTORE_TIME_PATTERN.search(time)
 
     if match:
         datetime_part = match.group(1)  # '2025-12-24 04:51:00'
@@ -66,7 +112,7 @@ def setup_logging(log_dir):
 
     # Create a file handler to log to a file
     file_handler = logging.FileHandler(log_file)
-    fileDebugLevel = getVarValue("LOG_UPLOAD_JOB_LOG_LEVEL")
+    fileDebugLevel = config["RESTORE_JOB_LOG_LEVEL"]
     if fileDebugLevel == "DEBUG":
         file_handler.setLevel(logging.DEBUG)
     else:
@@ -119,18 +165,687 @@ def createBackupAndDropDatabase(dbName, backupDir):
         logging.error(f"Database {dbName} could not be created.")
         exit(1)
 
+# Metrics of the previous restores (completed or failed), also used to estimate the duration of the next one
+HISTORY_FILE_NAME = "restoreHistory.json"
+HISTORY_MAX_RUNS = 20
+# Used when no previous restore recorded the size of an uncompressed backup
+DEFAULT_COMPRESSION_RATIO = 5.0
+
+# Phases of the current run: name -> {"bytes", "seconds", ...}
+phaseStats = {}
+# Summary of the current run, appended to the restore history on exit
+runMetrics = {}
+
+MB = 1024 * 1024
+
+
+def record_phase(name, byte_count, seconds, **extra):
+    stats = {"bytes": byte_count, "seconds": round(seconds, 3), **extra}
+    if seconds > 0:
+        stats["mb_per_s"] = round(byte_count / MB / seconds, 2)
+        if "events" in extra:
+            stats["events_per_s"] = round(extra["events"] / seconds, 1)
+    if extra.get("decompress_seconds"):
+        stats["decompress_mb_per_s"] = round(
+            extra["output_bytes"] / MB / extra["decompress_seconds"], 2
+        )
+    phaseStats[name] = stats
+    logging.info(f"Phase {name} took {format_duration(seconds)} ({format_phase_rates(stats)}).")
+
+
+def format_phase_rates(stats):
+    rates = [f"{format_size(stats['bytes'])}"]
+    if "mb_per_s" in stats:
+        rates.append(f"{stats['mb_per_s']} MB/s")
+    if "decompress_mb_per_s" in stats:
+        rates.append(f"decompression {stats['decompress_mb_per_s']} MB/s")
+    if "events_per_s" in stats:
+        rates.append(f"{stats['events']} events, {stats['events_per_s']} events/s")
+    return ", ".join(rates)
+
+
+def start_run_metrics(log_dir, restore_mode, replay_mode):
+    """Starts collecting the metrics of this run. They are written on exit, even if the restore fails."""
+    runMetrics.update(
+        {
+            "started": datetime.now(timezone.utc).strftime("%Y-%m-%dT%H:%M:%SZ"),
+            "restore_mode": restore_mode,
+            "replay_mode": replay_mode,
+            "status": "failed",
+            "start_time": time.monotonic(),
+        }
+    )
+    atexit.register(write_run_metrics, log_dir)
+
+
+def write_run_metrics(log_dir):
+    """
+    Appends the metrics of this run to the restore history next to the log file
+    and logs a per-phase timing report.
+    """
+    summary = {key: value for key, value in runMetrics.items() if key != "start_time"}
+    summary["finished"] = datetime.now(timezone.utc).strftime("%Y-%m-%dT%H:%M:%SZ")
+    summary["wall_seconds"] = round(time.monotonic() - runMetrics["start_time"], 3)
+    summary["phases"] = phaseStats
+
+    logging.info(f"Restore {summary['status']} after {format_duration(summary['wall_seconds'])}. Phase timings:")
+    for name, stats in phaseStats.items():
+        share = stats["seconds"] / summary["wall_seconds"] * 100 if summary["wall_seconds"] else 0
+        logging.info(f"  {name}: {format_duration(stats['seconds'])} ({share:.0f}%), {format_phase_rates(stats)}")
+    if phaseStats:
+        slowest = max(phaseStats, key=lambda name: phaseStats[name]["seconds"])
+        logging.info(f"Slowest phase: {slowest}")
+
+    history = load_restore_history(log_dir)
+    history.append(summary)
+    history_file = os.path.join(log_dir, HISTORY_FILE_NAME)
+    with open(history_file, "w") as f:
+        json.dump(history[-HISTORY_MAX_RUNS:], f, indent=2)
+    logging.info(f"Restore metrics written to {history_file}")
+
+
+def load_restore_history(log_dir):
+    history_file = os.path.join(log_dir, HISTORY_FILE_NAME)
+    if not os.path.isfile(history_file):
+        return []
+    with open(history_file, "r") as f:
+        return json.load(f)
+
+
+def get_phase_throughput(history, phase):
+    """
+    Average throughput (bytes/s) of a phase over the recorded runs, or None.
+    A phase is only recorded once it finished, so the finished phases of failed runs count too.
+    """
+    total_bytes = 0
+    total_seconds = 0
+    for run in history:
+        stats = run["phases"].get(phase)
+        if stats and stats["seconds"] > 0:
+            total_bytes += stats["bytes"]
+            total_seconds += stats["seconds"]
+    if not total_seconds:
+        return None
+    return total_bytes / total_seconds
+
+
+def get_compression_ratio(history):
+    compressed = 0
+    uncompressed = 0
+    for run in history:
+        for stats in run["phases"].values():
+            if stats.get("output_bytes"):
+                compressed += stats["bytes"]
+                uncompressed += stats["output_bytes"]
+    if not compressed:
+        return None
+    return uncompressed / compressed
+
+
+def format_size(byte_count):
+    for unit in ["B", "KB", "MB", "GB"]:
+        if byte_count < 1024:
+            return f"{byte_count:.1f} {unit}"
+        byte_count /= 1024
+    return f"{byte_count:.1f} TB"
+
+
+def format_duration(seconds):
+    if seconds is None:
+        return "unknown (no previous runs)"
+    minutes, seconds = divmod(int(seconds), 60)
+    hours, minutes = divmod(minutes, 60)
+    return f"{hours}h {minutes:02d}m {seconds:02d}s"
+
+
+def get_mysql_datadir():
+    """Asks the MySQL server for its data directory, or None when the server can't be reached."""
+    try:
+        result = subprocess.run(
+            ["mysql", "-N", "-B", "-e", "SELECT @@datadir"], check=True, capture_output=True, text=True
+        )
+    except (OSError, subprocess.CalledProcessError) as e:
+        logging.warning(f"WARNING: Could not read the MySQL data directory, its disk space is not checked: {e}")
+        return None
+    return result.stdout.strip() or None
+
+
+def get_filesystem_id(path):
+    """Device ID of the filesystem holding path (or its closest existing parent, for directories not created yet)."""
+    path = os.path.abspath(path)
+    while not os.path.exists(path):
+        path = os.path.dirname(path)
+    return os.stat(path).st_dev, path
+
+
+def plan_restore(
+    bucket_name, backups_prefix, logs_prefix, restore_time, download_dir, log_dir, restore_mode, replay_mode,
+    cache_dir=None, cache_max_bytes=0
+):
+    """
+    Resolves the backup and binary log chain for restore_time and reports the bytes to download,
+    the expected duration of each phase and the disk space needed. Nothing is downloaded or dropped.
+    The disk space is checked per filesystem: the needs of the download directory, the download
+    cache, /tmp and the MySQL data directory are added up when they share one.
+
+    :param cache_dir: Directory of the download cache, None when the cache is disabled
+    :param cache_max_bytes: Maximum size of the download cache
+    :return: True if there is enough free disk space for the restore
+    """
+    backup = findLatestBackupBeforeTimestamp(bucket_name, backups_prefix, restore_time)
+    backup_bytes = backup["Size"]
+    compression = get_compression(backup["Key"])
+    manifest_backup = backup["Key"].endswith(MANIFEST_FILE_NAME)
+    if manifest_backup:
+        manifest = read_backup_manifest(bucket_name, backup["Key"])
+        start_log_file, start_log_pos = manifest["binlog_file"], manifest["binlog_position"]
+        backup_bytes = sum(chunk["size"] for chunk in [manifest["schema"], manifest["post"]] + manifest["tables"])
+        compression = manifest["compression"]
+        # Parallel backups are always streamed table by table
+        restore_mode = "parallel"
+    elif backup.get("BinlogFile"):
+        start_log_file, start_log_pos = backup["BinlogFile"], backup["BinlogPosition"]
+    else:
+        start_log_file, start_log_pos = extract_log_file_and_position_from_s3(
+            bucket_name, backup["Key"]
+        )
+    logs = selectLogsToDownload(bucket_name, logs_prefix, start_log_file)
+
+    history = load_restore_history(log_dir)
+    ratio = get_compression_ratio(history)
+    if ratio is None:
+        ratio = DEFAULT_COMPRESSION_RATIO
+    uncompressed_bytes = backup_bytes * ratio if compression else backup_bytes
+    log_bytes = sum(obj["Size"] for obj in logs)
+
+    logging.info(f"Restore plan for {restore_time} (restore mode: {restore_mode}, replay mode: {replay_mode})")
+    logging.info(f"Full backup: s3://{bucket_name}/{backup['Key']} ({format_size(backup_bytes)}, ~{format_size(uncompressed_bytes)} uncompressed)")
+    logging.info(f"Start position: {start_log_file} (position {start_log_pos})")
+    if logs:
+        logging.info(
+            f"Binary logs: {len(logs)} ({os.path.basename(logs[0]['Key'])} to {os.path.basename(logs[-1]['Key'])}, {format_size(log_bytes)})"
+        )
+    else:
+        logging.info("Binary logs: none found")
+    logging.info(f"Total download: {format_size(backup_bytes + log_bytes)}")
+
+    # (phase, bytes processed by the phase)
+    if restore_mode == "stream":
+        phases = [("backup_stream", backup_bytes)]
+    elif restore_mode == "parallel":
+        phases = [("backup_parallel", backup_bytes)]
+    else:
+        phases = [("backup_download", backup_bytes), ("backup_load", uncompressed_bytes)]
+    phases += [("log_download", log_bytes), ("log_replay", log_bytes)]
+
+    total_seconds = 0
+    for phase, byte_count in phases:
+        throughput = get_phase_throughput(history, phase)
+        seconds = byte_count / throughput if throughput else None
+        if seconds is None:
+            total_seconds = None
+        elif total_seconds is not None:
+            total_seconds += seconds
+        logging.info(f"Estimated {phase}: {format_duration(seconds)}")
+    logging.info(f"Estimated total: {format_duration(total_seconds)}")
+
+    # Disk space needed per directory
+    downloaded_bytes = log_bytes
+    if restore_mode == "file" or (restore_mode == "parallel" and not manifest_backup):
+        # The parallel mode spools at most the whole uncompressed dump (parallel backups are not spooled)
+        downloaded_bytes += uncompressed_bytes
+    disk_needs = [(download_dir, downloaded_bytes)]
+    if cache_dir and get_filesystem_id(cache_dir)[0] != get_filesystem_id(download_dir)[0]:
+        # On the same filesystem the cache hard links the downloads, elsewhere it keeps copies
+        disk_needs.append((cache_dir, min(downloaded_bytes, cache_max_bytes)))
+    if replay_mode != "pipe":
+        # The combined SQL file is roughly the size of the binary logs
+        disk_needs.append(("/tmp", log_bytes))
+    datadir = get_mysql_datadir()
+    if datadir:
+        # The restored tables and the changes replayed from the binary logs
+        disk_needs.append((datadir, uncompressed_bytes + log_bytes))
+
+    # Directories sharing a filesystem are checked against its free space together
+    filesystems = {}
+    for path, needed in disk_needs:
+        device, existing_path = get_filesystem_id(path)
+        filesystem = filesystems.setdefault(device, {"path": existing_path, "dirs": [], "needed": 0})
+        filesystem["dirs"].append(path)
+        filesystem["needed"] += needed
+
+    enough_space = True
+    for filesystem in filesystems.values():
+        free = shutil.disk_usage(filesystem["path"]).free
+        status = "OK" if free >= filesystem["needed"] else "NOT ENOUGH"
+        if free < filesystem["needed"]:
+            enough_space = False
+        logging.info(
+            f"Disk space for {', '.join(filesystem['dirs'])}: ~{format_size(filesystem['needed'])} needed, "
+            f"{format_size(free)} free ({status})"
+        )
+
+    return enough_space
+
+
+# Progress of the current restore (verified downloads, completed load, last applied
+# binlog position), kept in DOWNLOAD_DIR so that a failed restore can be resumed
+STATE_FILE_NAME = "restoreState.json"
+restoreState = {"downloads": {}}
+stateFile = None
+stateLock = threading.Lock()
+
+
+def load_restore_state(download_dir, target):
+    """
+    Loads the checkpoints of a previous run. Checkpoints of a run with a different target
+    (database, backup or restore time) are discarded, verified downloads are always kept.
+
+    :param download_dir: Directory holding the state file
+    :param target: Dict identifying the restore
+    """
+    global stateFile
+    stateFile = os.path.join(download_dir, STATE_FILE_NAME)
+    state = {}
+    if os.path.isfile(stateFile):
+        with open(stateFile, "r") as f:
+            state = json.load(f)
+
+    # Forget downloads that are no longer on disk
+    downloads = {
+        key: download
+        for key, download in state.get("downloads", {}).items()
+        if os.path.isfile(download["path"])
+    }
+    if state.get("target") == target:
+        logging.info(
+            f"Resuming previous restore (backup loaded: {state.get('backup_loaded', False)}, replay checkpoint: {state.get('replay_log')} {state.get('replay_position')})."
+        )
+    else:
+        if state.get("target"):
+            logging.info("Previous restore state is for a different restore, starting from scratch.")
+        state = {}
+
+    restoreState.clear()
+    restoreState.update(state)
+    restoreState["target"] = target
+    restoreState["downloads"] = downloads
+    save_restore_state()
+
+
+def save_restore_state():
+    if stateFile is None:
+        return
+    with stateLock:
+        temp_file = stateFile + ".tmp"
+        with open(temp_file, "w") as f:
+            json.dump(restoreState, f, indent=2)
+        os.replace(temp_file, stateFile)
+
+
+def complete_restore_state():
+    """Clears the checkpoints once the restore is complete, the verified downloads are kept."""
+    with stateLock:
+        downloads = restoreState["downloads"]
+        restoreState.clear()
+        restoreState["downloads"] = downloads
+    save_restore_state()
+
+
+def record_download(s3_key, etag, local_file_path):
+    with stateLock:
+        restoreState["downloads"][s3_key] = {
+            "etag": etag,
+            "size": os.path.getsize(local_file_path),
+            "path": local_file_path,
+        }
+    save_restore_state()
+
+
+def is_downloaded(s3_key, etag, local_file_path, size=None):
+    """Whether a previous run fully downloaded this version (ETag) of the object to local_file_path."""
+    download = restoreState["downloads"].get(s3_key)
+    if not download or download["etag"] != etag or download["path"] != local_file_path:
+        return False
+    if not os.path.isfile(local_file_path):
+        return False
+    if size is not None and size != download["size"]:
+        return False
+    return os.path.getsize(local_file_path) == download["size"]
+
+
+class DownloadCache:
+    """
+    Local cache of downloaded backups and binary logs, addressed by S3 key and ETag.
+    Files are hard linked between the cache and the download directories (copied when
+    they are on different filesystems), the least recently used entries are evicted
+    once the cache grows over max_bytes.
+    """
+
+    INDEX_FILE_NAME = "index.json"
+
+    def __init__(self, cache_dir, max_bytes):
+        self.cache_dir = cache_dir
+        self.max_bytes = max_bytes
+        self.index_file = os.path.join(cache_dir, self.INDEX_FILE_NAME)
+        self.lock = threading.Lock()
+        os.makedirs(cache_dir, exist_ok=True)
+        self.entries = {}
+        if os.path.isfile(self.index_file):
+            with open(self.index_file, "r") as f:
+                self.entries = json.load(f)
+        # Forget entries whose file is gone
+        self.entries = {
+            name: entry
+            for name, entry in self.entries.items()
+            if os.path.isfile(os.path.join(cache_dir, name))
+        }
+
+    @staticmethod
+    def _name(s3_key, etag):
+        return hashlib.sha256(f"{s3_key}\0{etag}".encode("utf-8")).hexdigest()
+
+    @staticmethod
+    def _link(source, target):
+        if os.path.exists(target):
+            os.remove(target)
+        try:
+            os.link(source, target)
+        except OSError:
+            shutil.copyfile(source, target)
+
+    def _save_index(self):
+        temp_file = self.index_file + ".tmp"
+        with open(temp_file, "w") as f:
+            json.dump(self.entries, f, indent=2)
+        os.replace(temp_file, self.index_file)
+
+    def fetch(self, s3_key, etag, local_file_path):
+        """
+        Places the cached copy of the object at local_file_path.
+
+        :return: True on a cache hit, False otherwise
+        """
+        name = self._name(s3_key, etag)
+        with self.lock:
+            if name not in self.entries:
+                return False
+            self._link(os.path.join(self.cache_dir, name), local_file_path)
+            self.entries[name]["last_used"] = time.time()
+            self._save_index()
+        logging.info(f"Using cached copy of {s3_key} for {local_file_path}.")
+        return True
+
+    def store(self, s3_key, etag, local_file_path):
+        """Adds a downloaded object to the cache and evicts the least recently used entries."""
+        size = os.path.getsize(local_file_path)
+        if size > self.max_bytes:
+            return
+        name = self._name(s3_key, etag)
+        with self.lock:
+            self._link(local_file_path, os.path.join(self.cache_dir, name))
+            self.entries[name] = {"key": s3_key, "etag": etag, "size": size, "last_used": time.time()}
+
+            total = sum(entry["size"] for entry in self.entries.values())
+            for old_name, entry in sorted(self.entries.items(), key=lambda item: item[1]["last_used"]):
+                if total <= self.max_bytes:
+                    break
+                os.remove(os.path.join(self.cache_dir, old_name))
+                del self.entries[old_name]
+                total -= entry["size"]
+                logging.info(f"Evicted {entry['key']} from the download cache.")
+            self._save_index()
+
+
+# Set up in main when CACHE_MAX_SIZE_GB is not 0
+downloadCache = None
+
+
+def get_transfer_config():
+    """Builds the multipart transfer settings used for all S3 downloads."""
+    part_size = config["DOWNLOAD_PART_SIZE_MB"] * 1024 * 1024
+    return TransferConfig(
+        multipart_threshold=part_size,
+        multipart_chunksize=part_size,
+        max_concurrency=config["DOWNLOAD_CONCURRENCY"],
+        use_threads=True,
+    )
+
+
+def get_compression(filename):
+    """Returns the compression of a backup based on its suffix (gzip, zstd or None)."""
+    if filename.endswith(".gz"):
+        return "gzip"
+    if filename.endswith(".zst"):
+        return "zstd"
+    return None
+
+
+def create_decompressor(compression):
+    if compression == "zstd":
+        if zstandard is None:
+            raise RuntimeError("The zstandard package is needed to restore zstd compressed backups.")
+        return zstandard.ZstdDecompressor().decompressobj()
+    return zlib.decompressobj(16 + zlib.MAX_WBITS)
+
+
+class GzipStreamWriter:
+    """
+    Write-only file object that decompresses (gzip or zstd) everything written to it and
+    forwards the decompressed bytes to another file object (a local file or mysql stdin).
+    It reports itself as non-seekable, so boto3 writes the multipart download
+    parts in order.
+    """
+
+    def __init__(self, sink, compression="gzip"):
+        self.sink = sink
+        self.compression = compression
+        self.decompressor = create_decompressor(compression)
+        # Checksum of the downloaded bytes, compared with the one in the backup catalog
+        self.sha256 = hashlib.sha256()
+        # Pick up the CHANGE MASTER TO line from the dump header while it passes through
+        self.scanner = ChangeMasterScanner()
+        self.bytes_in = 0
+        self.bytes_out = 0
+        # Time spent decompressing vs. waiting on the sink (disk or mysql)
+        self.decompress_seconds = 0.0
+        self.sink_seconds = 0.0
+
+    def seekable(self):
+        return False
+
+    def write(self, data):
+        size = len(data)
+        self.bytes_in += size
+        self.sha256.update(data)
+        if not self.compression:
+            self._forward(data)
+            return size
+        while data:
+            # mysqldump output piped through gzip may contain multiple members
+            if self.decompressor.eof:
+                self.decompressor = create_decompressor(self.compression)
+            start = time.perf_counter()
+            chunk = self.decompressor.decompress(data)
+            self.decompress_seconds += time.perf_counter() - start
+            self._forward(chunk)
+            data = self.decompressor.unused_data
+        return size
+
+    def _forward(self, chunk):
+        self.bytes_out += len(chunk)
+        if not self.scanner.done:
+            self.scanner.feed(chunk)
+            if self.scanner.result:
+                logging.info(
+                    f"Found log starting point in the backup stream: {self.scanner.result[0]} (position {self.scanner.result[1]})"
+                )
+        start = time.perf_counter()
+        self.sink.write(chunk)
+        self.sink_seconds += time.perf_counter() - start
+
+    def close(self):
+        if self.compression:
+            self._forward(self.decompressor.flush())
+        start = time.perf_counter()
+        self.sink.close()
+        self.sink_seconds += time.perf_counter() - start
+
+    def verify(self, s3_key, expected_sha256):
+        """Exits if the downloaded bytes don't match the SHA-256 recorded at upload time."""
+        if expected_sha256 and self.sha256.hexdigest() != expected_sha256:
+            logging.error(
+                f"Checksum mismatch for {s3_key}: expected {expected_sha256}, got {self.sha256.hexdigest()}."
+            )
+            exit(1)
+
+    def get_stats(self):
+        """Byte counts and timings to record for the phase this writer was used in."""
+        return {
+            "output_bytes": self.bytes_out,
+            "decompress_seconds": round(self.decompress_seconds, 3),
+            "sink_seconds": round(self.sink_seconds, 3),
+        }
+
+
+# Catalog of the uploaded backups, maintained by uploadBackupsToS3.py under the backups prefix
+CATALOG_FILE_NAME = "_catalog.json"
+# Manifest of a parallel (per-table) backup made by uploadBackupsToS3.py --parallel-dump
+MANIFEST_FILE_NAME = "_manifest.json"
+
+
+def readBackupCatalog(bucket_name, prefix):
+    """
+    Reads the backup catalog. Its entries are sorted by creation time and hold the
+    backup key, creation time (UTC), binary log file/position and size.
+
+    :return: List of catalog entries, or None if the prefix has no catalog
+    """
+    s3_client = boto3.client("s3")
+    catalog_key = prefix.rstrip("/") + "/" + CATALOG_FILE_NAME
+    try:
+        response = s3_client.get_object(Bucket=bucket_name, Key=catalog_key)
+    except s3_client.exceptions.NoSuchKey:
+        logging.info(f"No backup catalog found at s3://{bucket_name}/{catalog_key}, listing the prefix instead.")
+        return None
+    return json.loads(response["Body"].read())["backups"]
+
+
+def findLatestBackupBeforeTimestamp(bucket_name, prefix, cutoff_datetime_str):
+    """
+    Find the latest backup in an S3 bucket with a specific prefix that was created before the given datetime.
+    The backup catalog is used when present; otherwise the prefix is listed and LastModified is compared.
+
+    :param bucket_name: The S3 bucket name
+    :param prefix: The S3 prefix (folder path)
+    :param cutoff_datetime_str: The datetime string (e.g., '2023-12-01 00:00:00 +0200') to compare against
+    :return: Dict with the backup Key, LastModified and Size (plus BinlogFile/BinlogPosition when known)
+    """
+
+    # Convert the given datetime string to a datetime object
+    cutoff_datetime = datetime.strptime(cutoff_datetime_str, "%Y-%m-%d %H:%M:%S %z")
+
+    catalog = readBackupCatalog(bucket_name, prefix)
+    if catalog is not None:
+        # Catalog times are UTC ISO 8601 strings, so they sort and compare as strings
+        created = [entry["created"] for entry in catalog]
+        cutoff = cutoff_datetime.astimezone(timezone.utc).strftime("%Y-%m-%dT%H:%M:%SZ")
+        index = bisect.bisect_left(created, cutoff) - 1
+        if index < 0:
+            logging.info("No backups found in the catalog that were created before the specified timestamp.")
+            exit(0)
+
+        entry = catalog[index]
+        latest_file = {
+            "Key": entry["key"],
+            "LastModified": datetime.strptime(entry["created"], "%Y-%m-%dT%H:%M:%SZ").replace(tzinfo=timezone.utc),
+            "Size": entry["size"],
+            "BinlogFile": entry.get("binlog_file"),
+            "BinlogPosition": entry.get("binlog_position"),
+            "Sha256": entry.get("sha256"),
+        }
+        logging.info(
+            f"Latest backup before {cutoff_datetime_str}: {latest_file['Key']} (Created: {latest_file['LastModified']})"
+        )
+        return latest_file
+
+    # Initialize the S3 client
+    s3_client = boto3.client("s3")
+
+    latest_file = None
+    latest_modified = None
+
+    # List objects in the S3 bucket with the given prefix
+    paginator = s3_client.get_paginator("list_objects_v2")
+    for page in paginator.paginate(Bucket=bucket_name, Prefix=prefix):
+        for obj in page.get("Contents", []):
+            # Skip objects that represent folders (keys ending with '/') and the catalog
+            if obj["Key"].endswith("/") or obj["Key"].endswith(CATALOG_FILE_NAME):
+                continue
+            # Parallel backups are represented by their manifest, skip their chunks
+            if "/" in obj["Key"][len(prefix):].strip("/") and not obj["Key"].endswith(MANIFEST_FILE_NAME):
+                continue
+
+            # Get the LastModified timestamp of the object
+            last_modified = obj["LastModified"]
+
+            # Only consider files with a LastModified timestamp earlier than the cutoff datetime
+            if last_modified < cutoff_datetime:
+                # If it's the latest file we've encountered so far, update the latest_file
+                if latest_modified is None or last_modified > latest_modified:
+                    latest_file = obj
+                    latest_modified = last_modified
+
+    if not latest_file:
+        logging.info(
+            "No files found that were modified before the specified timestamp."
+        )
+        exit(0)
+
+    logging.info(
+        f"Latest backup before {cutoff_datetime_str}: {latest_file['Key']} (Last Modified: {latest_modified})"
+    )
+    return latest_file
+
+
 def downloadLatestBackupBeforeTimestamp(
     bucket_name, prefix, cutoff_datetime_str, download_dir
 ):
     """
     Download the latest file from an S3 bucket with a specific prefix, if its last modified date is earlier than the given datetime.
-    Only files (not folders) will be considered.
+    Only files (not folders) will be considered. Gzipped backups are decompressed while downloading.
 
     :param bucket_name: The S3 bucket name
     :param prefix: The S3 prefix (folder path)
     :param cutoff_datetime_str: The datetime string (e.g., '2023-12-01 00:00:00 +0200') to compare LastModified
     :param download_dir: Directory to download the file to
     """
+    latest_file = findLatestBackupBeforeTimestamp(
+        bucket_name, prefix, cutoff_datetime_str
+    )
+    return downloadBackup(bucket_name, latest_file["Key"], download_dir)
+
+
+def downloadBackup(bucket_name, s3_key, download_dir, expected_sha256=None):
+    """
+    Download a backup from S3, decompressing it on the fly if it is compressed.
+
+    :param bucket_name: The S3 bucket name
+    :param s3_key: The S3 key of the backup
+    :param download_dir: Directory to download the file to
+    :param expected_sha256: SHA-256 of the backup from the catalog, verified after the download
+    :return: Path of the (uncompressed) backup file
+    """
+    s3_client = boto3.client("s3")
+    local_file_path = os.path.join(download_dir, os.path.basename(s3_key))
+    if get_compression(s3_key):
+        # Decompress on the fly, only the uncompressed dump lands on disk
+        local_file_path = os.path.splitext(local_file_path)[0]
+
+    etag = s3_client.head_object(Bucket=bucket_name, Key=s3_key)["ETag"]
+    if is_downloaded(s3_key, etag, local_file_path):
+        logging.info(f"Backup {local_file_path} was already downloaded by a previous run, skipping download.")
+        return local_file_path
           
     # Empty the download directory
     items = os.listdir(download_dir)
@@ -148,59 +863,32 @@ def downloadLatestBackupBeforeTimestamp(
         else:
             logging.info(f"Skipping directory: {item_path}")
 
-        
-    # Convert the given datetime string to a datetime object
-    cutoff_datetime = datetime.strptime(cutoff_datetime_str, "%Y-%m-%d %H:%M:%S %z")
-    # Initialize the S3 client
-    s3_client = boto3.client("s3")
-
-    latest_file = None
-    latest_modified = None
+    if downloadCache and downloadCache.fetch(s3_key, etag, local_file_path):
+        record_download(s3_key, etag, local_file_path)
+        return local_file_path
 
     try:
-        # List objects in the S3 bucket with the given prefix
-        response = s3_client.list_objects_v2(Bucket=bucket_name, Prefix=prefix)
-
-        # Check if 'Contents' is in the response (i.e., the bucket isn't empty)
-        if "Contents" in response:
-            for obj in response["Contents"]:
-                # Skip objects that represent folders (keys ending with '/')
-                if obj["Key"].endswith("/"):
-                    continue
-
-                # Get the LastModified timestamp of the object
-                last_modified = obj["LastModified"]
-
-                # Only consider files with a LastModified timestamp earlier than the cutoff datetime
-                if last_modified < cutoff_datetime:
-                    # If it's the latest file we've encountered so far, update the latest_file
-                    if latest_modified is None or last_modified > latest_modified:
-                        latest_file = obj
-                        latest_modified = last_modified
-
-            if latest_file:
-                # Download the latest file before the cutoff datetime
-                s3_key = latest_file["Key"]
-                local_file_path = os.path.join(download_dir, os.path.basename(s3_key))
-
-                logging.info(
-                    f"Downloading the latest backup: {s3_key} (Last Modified: {latest_modified})"
-                )
-                s3_client.download_file(bucket_name, s3_key, local_file_path)
-                logging.info(f"Downloaded backup {local_file_path} successfully.")
-                decompress_command = ["gzip", "-d", local_file_path]
-                subprocess.run(decompress_command)
-                local_file_path = os.path.splitext(local_file_path)[0]
-                logging.info(f"Decompressed backup {local_file_path}.")
-                return local_file_path
-            else:
-                logging.info(
-                    "No files found that were modified before the specified timestamp."
-                )
-                exit(0)
-
-        else:
-            logging.info("No objects found in the specified bucket/prefix.")
+        logging.info(f"Downloading the latest backup: {s3_key}")
+        phase_start = time.monotonic()
+        writer = GzipStreamWriter(
+            open(local_file_path, "wb"), compression=get_compression(s3_key)
+        )
+        s3_client.download_fileobj(
+            bucket_name, s3_key, writer, Config=get_transfer_config()
+        )
+        writer.close()
+        writer.verify(s3_key, expected_sha256)
+        record_phase(
+            "backup_download",
+            writer.bytes_in,
+            time.monotonic() - phase_start,
+            **writer.get_stats(),
+        )
+        record_download(s3_key, etag, local_file_path)
+        if downloadCache:
+            downloadCache.store(s3_key, etag, local_file_path)
+        logging.info(f"Downloaded and decompressed backup {local_file_path} successfully.")
+        return local_file_path
 
     except NoCredentialsError:
         logging.error("ERROR: No AWS credentials found.")
@@ -210,55 +898,128 @@ def downloadLatestBackupBeforeTimestamp(
         logging.error(f"ERROR: An error occurred: {e}")
 
 
-def downloadLogs(bucket_name, prefix, download_dir):
+def binlog_sequence(filename):
     """
-    Download the latest file from an S3 bucket with a specific prefix, if its last modified date is earlier than the given datetime.
-    Only files (not folders) will be considered.
+    Numeric suffix of a binary log file name (mysql-bin.000042 -> 42).
+    Logs are ordered by it, not by name, as the suffix grows past its zero padding (.999999 -> .1000000).
+    """
+    suffix = os.path.splitext(os.path.basename(filename))[1][1:]
+    return int(suffix) if suffix.isdigit() else -1
+
+
+def selectLogsToDownload(bucket_name, prefix, start_log):
+    """
+    Select the binary logs needed to roll forward from start_log.
+    Every log from start_log onward is selected: the S3 LastModified of a log is when it was
+    uploaded, not when it was closed, so it cannot tell which log holds the cutoff.
+    The replay itself stops at the cutoff (mysqlbinlog --stop-datetime).
+
+    :param bucket_name: The S3 bucket name
+    :param prefix: The S3 prefix (folder path)
+    :param start_log: Binary log file name recorded in the full backup (e.g. mysql-bin.000042)
+    :return: List of S3 objects (as returned by list_objects_v2), in replay order
+    """
+    log_base_name = os.path.splitext(start_log)[0]
+    start_sequence = binlog_sequence(start_log)
+    s3_client = boto3.client("s3")
+
+    selected = []
+    paginator = s3_client.get_paginator("list_objects_v2")
+    for page in paginator.paginate(Bucket=bucket_name, Prefix=prefix):
+        for obj in page.get("Contents", []):
+            filename = os.path.basename(obj["Key"])
+            # Skip folders, the binlog index and logs of other servers
+            if obj["Key"].endswith("/") or filename.endswith(".index"):
+                continue
+            if os.path.splitext(filename)[0] != log_base_name:
+                continue
+            if binlog_sequence(filename) >= start_sequence:
+                selected.append(obj)
+
+    return sorted(selected, key=lambda o: binlog_sequence(o["Key"]))
+
+
+def downloadLogs(bucket_name, prefix, download_dir, start_log):
+    """
+    Download the binary logs needed to roll forward from start_log.
+    Logs are downloaded concurrently through a bounded pool. Logs already downloaded by a
+    previous run (same ETag and size) are kept, everything else in download_dir is removed.
 
     :param bucket_name: The S3 bucket name
     :param prefix: The S3 prefix (folder path)
     :param download_dir: Directory to download the file to
+    :param start_log: Binary log file name recorded in the full backup
     """
-        
-    # Empty the download directory
-    items = os.listdir(download_dir)
-    for item in items:
-        item_path = os.path.join(download_dir, item)
-        
-        # If the item is a file, delete it
-        if os.path.isfile(item_path):
-            try:
-                os.remove(item_path)
-                logging.info(f"Deleted file: {item_path}")
-            except Exception as e:
-                logging.error(f"Error deleting file {item_path}: {e}")
-                raise
-        else:
-            logging.info(f"Skipping directory: {item_path}")
-            
             
     # Initialize the S3 client
     s3_client = boto3.client("s3")
 
+    def local_path(obj):
+        return os.path.join(download_dir, os.path.basename(obj["Key"]))
+
+    def download_log(obj):
+        local_file_path = local_path(obj)
+        logging.info(f"Downloading log {obj['Key']} to {local_file_path}")
+        s3_client.download_file(
+            bucket_name, obj["Key"], local_file_path, Config=get_transfer_config()
+        )
+        record_download(obj["Key"], obj["ETag"], local_file_path)
+        if downloadCache:
+            downloadCache.store(obj["Key"], obj["ETag"], local_file_path)
+        logging.info(f"Downloaded log {local_file_path}.")
+
     try:
-        # List objects in the S3 bucket with the given prefix
-        response = s3_client.list_objects_v2(Bucket=bucket_name, Prefix=prefix)
-
-        # Check if 'Contents' is in the response (i.e., the bucket isn't empty)
-        if "Contents" in response:
-            for obj in response["Contents"]:
-                # Skip objects that represent folders (keys ending with '/')
-                if obj["Key"].endswith("/"):
-                    continue
-
-                s3_key = obj["Key"]
-                local_file_path = os.path.join(download_dir, os.path.basename(s3_key))
-                logging.info(f"Downloading log {s3_key} to {local_file_path}")
-                s3_client.download_file(bucket_name, s3_key, local_file_path)
-                logging.info(f"Downloaded log {local_file_path}.")
+        logs = selectLogsToDownload(bucket_name, prefix, start_log)
 
-        else:
-            logging.info("No objects found in the specified bucket/prefix.")
+        # Keep the logs a previous run already downloaded, delete anything else
+        complete = {
+            local_path(obj)
+            for obj in logs
+            if is_downloaded(obj["Key"], obj["ETag"], local_path(obj), obj["Size"])
+        }
+        for item in os.listdir(download_dir):
+            item_path = os.path.join(download_dir, item)
+            if os.path.isfile(item_path) and item_path not in complete:
+                try:
+                    os.remove(item_path)
+                    logging.info(f"Deleted file: {item_path}")
+                except Exception as e:
+                    logging.error(f"Error deleting file {item_path}: {e}")
+                    raise
+
+        if not logs:
+            logging.info("No binary logs found in the specified bucket/prefix.")
+            return
+        if complete:
+            logging.info(f"{len(complete)} binary logs were already downloaded by a previous run.")
+        logs = [obj for obj in logs if local_path(obj) not in complete]
+
+        if downloadCache:
+            cached = []
+            for obj in logs:
+                if downloadCache.fetch(obj["Key"], obj["ETag"], local_path(obj)):
+                    record_download(obj["Key"], obj["ETag"], local_path(obj))
+                    cached.append(obj)
+            logs = [obj for obj in logs if obj not in cached]
+
+        logging.info(f"Downloading {len(logs)} binary logs.")
+        workers = config["LOG_DOWNLOAD_WORKERS"]
+        phase_start = time.monotonic()
+        with ThreadPoolExecutor(max_workers=workers) as executor:
+            futures = {executor.submit(download_log, obj): obj for obj in logs}
+            for future in as_completed(futures):
+                try:
+                    future.result()
+                except Exception as e:
+                    # A gap in the binary log chain makes the roll forward invalid
+                    logging.error(f"ERROR: Failed to download log {futures[future]['Key']}: {e}")
+                    executor.shutdown(cancel_futures=True)
+                    exit(1)
+        record_phase(
+            "log_download",
+            sum(obj["Size"] for obj in logs),
+            time.monotonic() - phase_start,
+        )
 
     except NoCredentialsError:
         logging.error("ERROR: No AWS credentials found.")
@@ -267,26 +1028,93 @@ def downloadLogs(bucket_name, prefix, download_dir):
     except Exception as e:
         logging.error(f"ERROR: An error occurred: {e}")
 
+# Pattern of the -- CHANGE MASTER TO line written by mysqldump --master-data
+CHANGE_MASTER_PATTERN = re.compile(
+    b"--\s*CHANGE MASTER TO MASTER_LOG_FILE='([^']+)',\s*MASTER_LOG_POS=(\d+);"
+)
+
+
+# The CHANGE MASTER TO line is part of the dump header, give up after this many bytes
+CHANGE_MASTER_SCAN_LIMIT = 64 * 1024 * 1024
+
+
+class ChangeMasterScanner:
+    """
+    Incrementally searches a decompressed dump for the CHANGE MASTER TO line.
+    Only a small tail of the data is kept between chunks, and the search stops at
+    the first match or after CHANGE_MASTER_SCAN_LIMIT bytes.
+    """
+
+    # Enough to hold a CHANGE MASTER TO line split across two chunks
+    OVERLAP = 4096
+
+    def __init__(self, limit=CHANGE_MASTER_SCAN_LIMIT):
+        self.limit = limit
+        self.scanned = 0
+        self.tail = b""
+        self.result = None
+
+    @property
+    def done(self):
+        return self.result is not None or self.scanned >= self.limit
+
+    def feed(self, chunk):
+        if self.done:
+            return
+        data = self.tail + chunk
+        match = CHANGE_MASTER_PATTERN.search(data)
+        if match:
+            self.result = (match.group(1).decode("utf-8"), int(match.group(2)))
+            self.tail = b""
+            return
+        self.scanned += len(chunk)
+        self.tail = data[-self.OVERLAP:]
+
+    def get_result(self):
+        if self.result is None:
+            raise ValueError("No CHANGE MASTER TO line found in the backup file.")
+        return self.result
+
+
+def scan_log_file_and_position(stream, compression, chunk_size=64 * 1024):
+    """
+    Reads a dump from a binary file object until the CHANGE MASTER TO line is found.
+
+    :param stream: File object to read from (local file or S3 streaming body)
+    :param compression: Compression of the stream (gzip, zstd or None)
+    :return: The binary log file and position
+    """
+    scanner = ChangeMasterScanner()
+    decompressor = create_decompressor(compression)
+    while not scanner.done:
+        chunk = stream.read(chunk_size)
+        if not chunk:
+            break
+        if compression:
+            if decompressor.eof:
+                decompressor = create_decompressor(compression)
+            chunk = decompressor.decompress(chunk)
+        scanner.feed(chunk)
+
+    return scanner.get_result()
+
+
 def extract_log_file_and_position(backup_file_path):
     logging.info("Retrieving log starting point in the backup file.")
-    # Define a regex pattern to match the -- CHANGE MASTER TO line
-    pattern = re.compile(b"--\s*CHANGE MASTER TO MASTER_LOG_FILE='([^']+)',\s*MASTER_LOG_POS=(\d+);")
-    
-    # Open the backup file
-    with open(backup_file_path, 'rb') as file:
-        # Read the entire file
-        content = file.read()
-    
-    # Search for the CHANGE MASTER TO pattern
-    match = pattern.search(content)
-    
-    if match:
-        # Extract the binary log file and position
-        log_file = match.group(1)
-        log_pos = int(match.group(2))
-        return log_file.decode('utf-8'), log_pos
-    else:
-        raise ValueError("No CHANGE MASTER TO line found in the backup file.")
+
+    with open(backup_file_path, "rb") as file:
+        return scan_log_file_and_position(file, get_compression(backup_file_path))
+
+
+def extract_log_file_and_position_from_s3(bucket_name, s3_key):
+    """Reads only the head of a backup in S3 to find its log starting point."""
+    logging.info(f"Retrieving log starting point from s3://{bucket_name}/{s3_key}.")
+    s3_client = boto3.client("s3")
+    body = s3_client.get_object(Bucket=bucket_name, Key=s3_key)["Body"]
+    try:
+        return scan_log_file_and_position(body, get_compression(s3_key))
+    finally:
+        body.close()
 
 
 def restore_database(backup_file, db_name):
@@ -294,18 +1122,308 @@ def restore_database(backup_file, db_name):
     logging.info(f"Restoring database {db_name} from {backup_file}...")
     restore_command = ["mysql", db_name]
     try:
+        phase_start = time.monotonic()
         with open(backup_file, "r") as f:
-            subprocess.run(restore_command, stdin=f)
-        logging.info(f"Database {db_name} restored successfully.")
+            result = subprocess.run(restore_command, stdin=f)
     except:
         logging.error(f"Database {db_name} could not be restored.")
         exit(1)
 
-def apply_combined_binary_logs(binlog_dir, db_name, startLog, startPosition, end_time):
-    """Applies combined binary logs for the database within the time range."""
+    if result.returncode != 0:
+        logging.error(f"Database {db_name} could not be restored (mysql exit code {result.returncode}).")
+        exit(1)
+    record_phase("backup_load", os.path.getsize(backup_file), time.monotonic() - phase_start)
+    logging.info(f"Database {db_name} restored successfully.")
+
+
+def stream_restore_database(bucket_name, s3_key, db_name, expected_sha256=None):
+    """
+    Restores the database by streaming the backup from S3 through the decompressor into mysql.
+    Nothing is written to disk. The checksum can only be verified once the backup is loaded.
+
+    :return: The binary log file and position recorded in the backup
+    """
+    logging.info(f"Restoring database {db_name} by streaming s3://{bucket_name}/{s3_key}...")
+    s3_client = boto3.client("s3")
+    process = subprocess.Popen(["mysql", db_name], stdin=subprocess.PIPE)
+    writer = GzipStreamWriter(process.stdin, compression=get_compression(s3_key))
+    phase_start = time.monotonic()
+    try:
+        s3_client.download_fileobj(
+            bucket_name, s3_key, writer, Config=get_transfer_config()
+        )
+        writer.close()
+    except Exception as e:
+        process.kill()
+        process.wait()
+        logging.error(f"Database {db_name} could not be restored: {e}")
+        exit(1)
+
+    if process.wait() != 0:
+        logging.error(f"Database {db_name} could not be restored (mysql exit code {process.returncode}).")
+        exit(1)
+    writer.verify(s3_key, expected_sha256)
+    record_phase(
+        "backup_stream",
+        writer.bytes_in,
+        time.monotonic() - phase_start,
+        **writer.get_stats(),
+    )
+    logging.info(f"Database {db_name} restored successfully.")
+
+    return writer.scanner.get_result()
+
+
+class DumpSplitter:
+    """
+    Write-only file object that splits a mysqldump stream into per-table sections
+    and loads them through a pool of concurrent mysql sessions.
+
+    Each section is spooled to its own file as it streams by and is handed to the
+    pool once complete, so loading one table never blocks reading the next one.
+    The dump header (DROP/CREATE DATABASE) runs first in a session of its own.
+    Its SET statements, with foreign key and unique checks disabled, are repeated
+    at the top of every section. View, routine and event sections depend on the
+    tables, so they run in dump order once all tables are loaded.
+    """
+
+    SECTION_PATTERN = re.compile(
+        rb"^-- (Table structure for table|Temporary view structure for view|Final view structure for view|Dumping routines|Dumping events)\b[^\n]*$",
+        re.MULTILINE,
+    )
+    NAME_PATTERN = re.compile(rb"`([^`]+)`")
+    SECTION_LABELS = {
+        b"Table structure for table": "table",
+        b"Temporary view structure for view": "temporary view",
+        b"Final view structure for view": "view",
+        b"Dumping routines": "routines",
+        b"Dumping events": "events",
+    }
+
+    def __init__(self, db_name, spool_dir, workers):
+        self.db_name = db_name
+        self.spool_dir = spool_dir
+        self.executor = ThreadPoolExecutor(max_workers=workers)
+        # Bound the number of spooled sections waiting for a loader
+        self.slots = threading.BoundedSemaphore(workers * 2)
+        self.preamble = []
+        self.session_header = None
+        self.pending = b""
+        self.current = None
+        self.section_count = 0
+        self.serial_sections = []
+        self.futures = []
+        self.errors = []
+
+    def write(self, data):
+        size = len(data)
+        data = self.pending + data
+        # Only look at complete lines, keep the rest for the next write
+        end = data.rfind(b"\n") + 1
+        self.pending = data[end:]
+        complete = data[:end]
+
+        position = 0
+        for match in self.SECTION_PATTERN.finditer(complete):
+            self._append(complete[position : match.start()])
+            self._start_section(match.group(1), match.group(0))
+            position = match.start()
+        self._append(complete[position:])
+        return size
+
+    def _append(self, chunk):
+        if not chunk:
+            return
+        if self.current is None:
+            self.preamble.append(chunk)
+        else:
+            self.current["file"].write(chunk)
+
+    def _run_preamble(self):
+        preamble = b"".join(self.preamble)
+        logging.info(f"Running the dump header for database {self.db_name}...")
+        result = subprocess.run(["mysql", self.db_name], input=preamble)
+        if result.returncode != 0:
+            raise RuntimeError(f"dump header failed (mysql exit code {result.returncode})")
+
+        header = [
+            line
+            for line in preamble.split(b"\n")
+            if (line.startswith(b"/*!") and b" SET " in line) or line.startswith(b"USE ")
+        ]
+        header += [b"SET FOREIGN_KEY_CHECKS=0;", b"SET UNIQUE_CHECKS=0;"]
+        self.session_header = b"\n".join(header) + b"\n"
+
+    def _start_section(self, kind, line):
+        self._finish_section()
+        if self.errors:
+            raise RuntimeError(f"Failed to load {len(self.errors)} sections, aborting")
+        if self.session_header is None:
+            self._run_preamble()
+
+        self.section_count += 1
+        match = self.NAME_PATTERN.search(line)
+        label = self.SECTION_LABELS[kind]
+        if match:
+            label += " " + match.group(1).decode("utf-8")
+        path = os.path.join(self.spool_dir, f"{self.section_count:06d}.sql")
+        spool_file = open(path, "wb")
+        spool_file.write(self.session_header)
+        self.current = {
+            "path": path,
+            "file": spool_file,
+            "label": label,
+            "table": kind == b"Table structure for table",
+        }
+
+    def _finish_section(self):
+        if self.current is None:
+            return
+        section = self.current
+        self.current = None
+        section["file"].close()
+        if section["table"]:
+            self.slots.acquire()
+            self.futures.append(
+                self.executor.submit(self._load_section, section["path"], section["label"], True)
+            )
+        else:
+            self.serial_sections.append(section)
+
+    def _load_section(self, path, label, release_slot=False):
+        try:
+            with open(path, "rb") as f:
+                result = subprocess.run(["mysql", self.db_name], stdin=f)
+            if result.returncode != 0:
+                raise RuntimeError(f"mysql exit code {result.returncode}")
+            os.remove(path)
+            logging.info(f"Loaded {label}.")
+        except Exception as e:
+            logging.error(f"Failed to load {label}: {e}")
+            self.errors.append(label)
+        finally:
+            if release_slot:
+                self.slots.release()
+
+    def close(self):
+        self._append(self.pending)
+        self.pending = b""
+        self._finish_section()
+        if self.session_header is None:
+            # Dump without any table
+            self._run_preamble()
+
+        self.executor.shutdown(wait=True)
+        if not self.errors:
+            for section in self.serial_sections:
+                self._load_section(section["path"], section["label"])
+        if self.errors:
+            raise RuntimeError(f"Failed to load: {', '.join(self.errors)}")
+
+
+def parallel_restore_database(bucket_name, s3_key, db_name, spool_dir, workers, expected_sha256=None):
+    """
+    Restores the database by streaming the backup from S3 and loading its tables
+    through a pool of concurrent mysql sessions (see DumpSplitter).
+
+    :return: The binary log file and position recorded in the backup
+    """
     logging.info(
-        f"Applying combined binary logs for {db_name} from log {startLog} (position {startPosition}) to {end_time}..."
+        f"Restoring database {db_name} from s3://{bucket_name}/{s3_key} with {workers} parallel loaders..."
+    )
+    os.makedirs(spool_dir, exist_ok=True)
+    for item in os.listdir(spool_dir):
+        os.remove(os.path.join(spool_dir, item))
+
+    s3_client = boto3.client("s3")
+    splitter = DumpSplitter(db_name, spool_dir, workers)
+    writer = GzipStreamWriter(splitter, compression=get_compression(s3_key))
+    phase_start = time.monotonic()
+    try:
+        s3_client.download_fileobj(
+            bucket_name, s3_key, writer, Config=get_transfer_config()
+        )
+        writer.close()
+    except Exception as e:
+        splitter.executor.shutdown(wait=True, cancel_futures=True)
+        logging.error(f"Database {db_name} could not be restored: {e}")
+        exit(1)
+    writer.verify(s3_key, expected_sha256)
+    record_phase(
+        "backup_parallel",
+        writer.bytes_in,
+        time.monotonic() - phase_start,
+        sections=splitter.section_count,
+        **writer.get_stats(),
+    )
+    logging.info(f"Database {db_name} restored successfully ({splitter.section_count} sections).")
+
+    return writer.scanner.get_result()
+
+
+def read_backup_manifest(bucket_name, manifest_key):
+    s3_client = boto3.client("s3")
+    return json.loads(s3_client.get_object(Bucket=bucket_name, Key=manifest_key)["Body"].read())
+
+
+def restore_manifest_backup(bucket_name, manifest_key, db_name, workers):
+    """
+    Restores a parallel backup (one object per table, see uploadBackupsToS3.py --parallel-dump):
+    the schema first, then the tables through a pool of concurrent mysql sessions, then the
+    triggers, routines and events. Every chunk is streamed from S3 and its checksum verified.
+
+    :return: The binary log file and position recorded in the manifest
+    """
+    manifest = read_backup_manifest(bucket_name, manifest_key)
+    logging.info(
+        f"Restoring database {db_name} from the {len(manifest['tables'])} tables of s3://{bucket_name}/{manifest_key} with {workers} parallel loaders..."
+    )
+    s3_client = boto3.client("s3")
+
+    def load_chunk(chunk, database):
+        command = ["mysql", database] if database else ["mysql"]
+        process = subprocess.Popen(command, stdin=subprocess.PIPE)
+        writer = GzipStreamWriter(process.stdin, compression=get_compression(chunk["key"]))
+        try:
+            s3_client.download_fileobj(
+                bucket_name, chunk["key"], writer, Config=get_transfer_config()
+            )
+            writer.close()
+        except Exception:
+            process.kill()
+            process.wait()
+            raise
+        if process.wait() != 0:
+            raise RuntimeError(f"mysql exit code {process.returncode} for {chunk['key']}")
+        writer.verify(chunk["key"], chunk.get("sha256"))
+        return writer.bytes_in
+
+    phase_start = time.monotonic()
+    try:
+        # The schema dump recreates the database and selects it itself
+        total_bytes = load_chunk(manifest["schema"], None)
+        with ThreadPoolExecutor(max_workers=workers) as executor:
+            futures = {executor.submit(load_chunk, chunk, db_name): chunk for chunk in manifest["tables"]}
+            for future in as_completed(futures):
+                total_bytes += future.result()
+                logging.debug(f"Loaded table {futures[future]['table']}")
+        total_bytes += load_chunk(manifest["post"], db_name)
+    except Exception as e:
+        logging.error(f"Database {db_name} could not be restored: {e}")
+        exit(1)
+    record_phase(
+        "backup_parallel",
+        total_bytes,
+        time.monotonic() - phase_start,
+        sections=len(manifest["tables"]) + 2,
     )
+    logging.info(f"Database {db_name} restored successfully ({len(manifest['tables'])} tables).")
+
+    return manifest["binlog_file"], manifest["binlog_position"]
+
+
+def prepare_binlog_dir(binlog_dir, startLog):
+    """Removes the binlog index and any log older than the start log from the download directory."""
     for filename in os.listdir(binlog_dir):
         file_path = os.path.join(binlog_dir, filename)
         
@@ -318,27 +1436,38 @@ def apply_combined_binary_logs(binlog_dir, db_name, startLog, startPosition, end
                 logging.error(f"Error deleting {file_path}: {e}")
 
         elif os.path.isfile(file_path) and not filename.endswith(".index"):
-            if file_path < startLog:
+            if binlog_sequence(filename) < binlog_sequence(startLog):
                 try:
                     os.remove(file_path)
                     logging.info(f"Deleted {file_path}: as it's older than the start log.")
                 except Exception as e:
                     logging.error(f"Error deleting {file_path}: {e}")
+
+
+def apply_combined_binary_logs(binlog_dir, db_name, startLog, startPosition, end_time):
+    """Applies combined binary logs for the database within the time range."""
+    logging.info(
+        f"Applying combined binary logs for {db_name} from log {startLog} (position {startPosition}) to {end_time}..."
+    )
+    prepare_binlog_dir(binlog_dir, startLog)
             
     conbinedLogFile = os.path.join('/tmp', 'replay_logs.sql')
     
     # Expand the wildcard for log files
-    log_files = glob.glob(f"{binlog_dir}/*")
+    log_files = sorted(glob.glob(f"{binlog_dir}/*"), key=binlog_sequence)
    
     command = [
     "mysqlbinlog",
-    "--start-position=" + str(startPosition),
     "--stop-datetime=" + end_time,
     "--database=" + db_name,
     "--result-file=" + conbinedLogFile,
     ] + log_files
+    # The start position only applies to the first log
+    if startPosition:
+        command.insert(1, "--start-position=" + str(startPosition))
 
     logging.info(f"Creating combined log...")
+    phase_start = time.monotonic()
     try:
         subprocess.run(command, check=True)
         logging.info(f"Created combined log at {conbinedLogFile}.")
@@ -346,6 +1475,11 @@ def apply_combined_binary_logs(binlog_dir, db_name, startLog, startPosition, end
         logging.error(f"Error creating binary log {conbinedLogFile}: {e}")
         raise
     apply_logs_to_mysql(conbinedLogFile, db_name, end_time)
+    record_phase(
+        "log_replay",
+        sum(os.path.getsize(log_file) for log_file in log_files),
+        time.monotonic() - phase_start,
+    )
 
 
 def apply_logs_to_mysql(combined_logs, db_name, end_time):
@@ -353,26 +1487,199 @@ def apply_logs_to_mysql(combined_logs, db_name, end_time):
     try:
         with open(combined_logs, "r") as f:
             command = ['mysql', db_name]
-            subprocess.run(command, stdin=f)
+            subprocess.run(command, stdin=f, check=True)
             logging.info(f"Applied logs until {end_time}")
     except subprocess.CalledProcessError as e:
         logging.error(f"Error applying replay logs: {e}")
+        exit(1)
+
+# Matches the "# at <position>" comments mysqlbinlog writes before every event
+BINLOG_POSITION_PATTERN = re.compile(rb"^# at (\d+)$", re.MULTILINE)
+# End position of the event mysqlbinlog is about to print
+BINLOG_END_POSITION_PATTERN = re.compile(rb"end_log_pos (\d+)")
+# Transaction commits in mysqlbinlog output (the delimiter is /*!*/ between events)
+BINLOG_COMMIT_PATTERN = re.compile(rb"^COMMIT/\*!\*/;\n", re.MULTILINE)
+# Marker selected by mysql once everything before it has been applied
+CHECKPOINT_PREFIX = b"restore-checkpoint "
+# Minimum interval between two checkpoint markers
+CHECKPOINT_INTERVAL = 1.0
+
+
+def read_replay_checkpoints(stream, on_checkpoint):
+    """Reads mysql output and reports every checkpoint marker mysql has reached."""
+    for line in stream:
+        if line.startswith(CHECKPOINT_PREFIX):
+            log_name, position = line[len(CHECKPOINT_PREFIX):].decode("utf-8").split()
+            on_checkpoint(log_name, None if position == "done" else int(position))
+        else:
+            sys.stdout.buffer.write(line)
+
+
+def apply_binary_logs_pipelined(
+    binlog_dir, db_name, startLog, startPosition, end_time, on_checkpoint=None
+):
+    """
+    Applies the binary logs by piping mysqlbinlog straight into mysql, one log at a time.
+    All logs go through a single mysql session, so no combined file is written and
+    the replay starts as soon as the first events are decoded.
+
+    When on_checkpoint is given, a SELECT marker is injected after committed transactions
+    (at most every CHECKPOINT_INTERVAL seconds) and at the end of each log. on_checkpoint
+    is called with the log name and the position to resume from (None once the log is
+    complete) as soon as mysql has executed the marker.
+
+    :param startPosition: Position to start the first log from, or None to start at its beginning
+    """
+    logging.info(
+        f"Applying binary logs for {db_name} from log {startLog} (position {startPosition}) to {end_time}..."
+    )
+    prepare_binlog_dir(binlog_dir, startLog)
+    log_files = sorted(glob.glob(f"{binlog_dir}/*"), key=binlog_sequence)
+
+    phase_start = time.monotonic()
+    total_events = 0
+    if on_checkpoint:
+        mysql_process = subprocess.Popen(
+            ["mysql", "--batch", "--skip-column-names", db_name],
+            stdin=subprocess.PIPE,
+            stdout=subprocess.PIPE,
+        )
+        checkpoint_reader = threading.Thread(
+            target=read_replay_checkpoints, args=(mysql_process.stdout, on_checkpoint)
+        )
+        checkpoint_reader.start()
+    else:
+        mysql_process = subprocess.Popen(["mysql", db_name], stdin=subprocess.PIPE)
+
+    for index, log_file in enumerate(log_files):
+        command = [
+            "mysqlbinlog",
+            "--stop-datetime=" + end_time,
+            "--database=" + db_name,
+        ]
+        # The start position only applies to the first log
+        if index == 0 and startPosition:
+            command.append("--start-position=" + str(startPosition))
+        command.append(log_file)
+
+        log_name = os.path.basename(log_file)
+        logging.info(f"Replaying log {log_name} ({index + 1}/{len(log_files)})...")
+        binlog_process = subprocess.Popen(command, stdout=subprocess.PIPE)
+        position = None
+        end_position = None
+        events = 0
+        pending = b""
+        last_report = time.monotonic()
+        last_checkpoint = time.monotonic()
+        try:
+            while True:
+                chunk = binlog_process.stdout.read(1024 * 1024)
+                if not chunk:
+                    mysql_process.stdin.write(pending)
+                    break
+                # Only handle complete lines, so that no pattern is split across chunks
+                data = pending + chunk
+                end = data.rfind(b"\n") + 1
+                pending = data[end:]
+                data = data[:end]
+
+                positions = BINLOG_POSITION_PATTERN.findall(data)
+                if positions:
+                    position = int(positions[-1])
+                    events += len(positions)
+
+                if on_checkpoint and time.monotonic() - last_checkpoint >= CHECKPOINT_INTERVAL:
+                    # Inject a marker after the last commit in this chunk; the next event
+                    # starts at the end position of the commit event
+                    commits = list(BINLOG_COMMIT_PATTERN.finditer(data))
+                    if commits:
+                        commit = commits[-1]
+                        end_positions = BINLOG_END_POSITION_PATTERN.findall(data, 0, commit.start())
+                        if end_positions:
+                            end_position = int(end_positions[-1])
+                            marker = b"SELECT '" + CHECKPOINT_PREFIX + f"{log_name} {end_position}".encode() + b"'/*!*/;\n"
+                            data = data[: commit.end()] + marker + data[commit.end() :]
+                            last_checkpoint = time.monotonic()
+
+                mysql_process.stdin.write(data)
+                if time.monotonic() - last_report >= 30:
+                    logging.info(f"Replaying log {log_name}: at position {position}")
+                    last_report = time.monotonic()
+
+            if on_checkpoint:
+                # mysqlbinlog output ends with DELIMITER ;
+                mysql_process.stdin.write(
+                    b"SELECT '" + CHECKPOINT_PREFIX + f"{log_name} done".encode() + b"';\n"
+                )
+        except BrokenPipeError:
+            binlog_process.kill()
+            binlog_process.wait()
+            logging.error(
+                f"mysql exited while replaying log {log_name} (last position {position}, mysql exit code {mysql_process.wait()})."
+            )
+            exit(1)
+
+        if binlog_process.wait() != 0:
+            mysql_process.stdin.close()
+            mysql_process.wait()
+            logging.error(f"mysqlbinlog failed for log {log_name} (exit code {binlog_process.returncode}).")
+            exit(1)
+        total_events += events
+        logging.info(f"Replayed log {log_name} up to position {position} ({events} events).")
+
+    mysql_process.stdin.close()
+    if on_checkpoint:
+        checkpoint_reader.join()
+    if mysql_process.wait() != 0:
+        logging.error(f"Error applying binary logs (mysql exit code {mysql_process.returncode}).")
+        exit(1)
+    record_phase(
+        "log_replay",
+        sum(os.path.getsize(log_file) for log_file in log_files),
+        time.monotonic() - phase_start,
+        events=total_events,
+    )
+    logging.info(f"Applied logs until {end_time}")
+
+
+def record_replay_checkpoint(log_name, position):
+    """Stores the point the replay can be resumed from (position None: log fully applied)."""
+    with stateLock:
+        restoreState["replay_log"] = log_name
+        restoreState["replay_position"] = position
+    save_restore_state()
+    logging.debug(f"Replay checkpoint: {log_name} {position}")
+
 
 if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument(
+        "--plan",
+        action="store_true",
+        help="Only report the backup, binary logs, expected duration and disk space needed for the restore",
+    )
+    args = parser.parse_args()
+
     # Input parameters
     varFile = "variables.txt"
+    try:
+        config = load_config(varFile, CONFIG_SPEC)
+    except ConfigError as e:
+        logging.error(f"ERROR: {e}. Exiting...")
+        exit(1)
 
-    logDir = getVarValue("SCRIPT_LOG_DIR")
+    logDir = config["SCRIPT_LOG_DIR"]
     setup_logging(logDir)
+    log_env_overrides(CONFIG_SPEC)
 
-    dbName = getVarValue("DB_NAME")
-    bucket_name = getVarValue("BUCKET_NAME")
-    backupsPrefix = getVarValue("FULL_BACKUPS_S3_PREFIX")
-    logsPrefix = getVarValue("DB_LOGS_S3_PREFIX")
-    restorePointTime = getVarValue("RESTORE_TIME")
-    backupDownloadDir = os.path.join(getVarValue("DOWNLOAD_DIR"), "backups")
-    logDownloadDir = os.path.join(getVarValue("DOWNLOAD_DIR"), "logs")
-    currentBackupDir = getVarValue("CURRENT_BACKUP_DIR")
+    dbName = config["DB_NAME"]
+    bucket_name = config["BUCKET_NAME"]
+    backupsPrefix = config["FULL_BACKUPS_S3_PREFIX"]
+    logsPrefix = config["DB_LOGS_S3_PREFIX"]
+    restorePointTime = config["RESTORE_TIME"]
+    backupDownloadDir = os.path.join(config["DOWNLOAD_DIR"], "backups")
+    logDownloadDir = os.path.join(config["DOWNLOAD_DIR"], "logs")
+    currentBackupDir = config["CURRENT_BACKUP_DIR"]
 
     # Ensure the download directories exist
     if not os.path.exists(backupDownloadDir):
@@ -382,15 +1689,128 @@ if __name__ == "__main__":
     if not os.path.exists(currentBackupDir):
         os.makedirs(currentBackupDir)
 
+    # file: download (decompressing on the fly) and load from disk
+    # stream: pipe the backup from S3 straight into mysql
+    # parallel: stream the backup from S3 and load its tables concurrently
+    restoreMode = config["RESTORE_MODE"]
+    # combined: convert all logs into one SQL file, then apply it
+    # pipe: stream mysqlbinlog output into mysql log by log
+    replayMode = config["REPLAY_MODE"]
+
+    if args.plan:
+        enough_space = plan_restore(
+            bucket_name,
+            backupsPrefix,
+            logsPrefix,
+            restorePointTime,
+            config["DOWNLOAD_DIR"],
+            logDir,
+            restoreMode,
+            replayMode,
+            cache_dir=(config["CACHE_DIR"] or os.path.join(config["DOWNLOAD_DIR"], "cache")) if config["CACHE_MAX_SIZE_GB"] > 0 else None,
+            cache_max_bytes=int(config["CACHE_MAX_SIZE_GB"] * 1024 * MB),
+        )
+        exit(0 if enough_space else 1)
+
+    start_run_metrics(logDir, restoreMode, replayMode)
+    cacheSize = config["CACHE_MAX_SIZE_GB"]
+    if cacheSize > 0:
+        downloadCache = DownloadCache(
+            config["CACHE_DIR"] or os.path.join(config["DOWNLOAD_DIR"], "cache"),
+            int(cacheSize * 1024 * MB),
+        )
     # createBackupAndDropDatabase(dbName, currentBackupDir)
-    backup_file = downloadLatestBackupBeforeTimestamp(
-        bucket_name, backupsPrefix, restorePointTime, backupDownloadDir
+    backup = findLatestBackupBeforeTimestamp(
+        bucket_name, backupsPrefix, restorePointTime
     )
-    downloadLogs(bucket_name, logsPrefix, logDownloadDir)
-    start_log_file, start_log_pos = extract_log_file_and_position(backup_file)
-    startLogFilePath = os.path.join(logDownloadDir, start_log_file)
-    restore_database(backup_file, dbName)
-    apply_combined_binary_logs(
-        logDownloadDir, dbName, startLogFilePath, start_log_pos, convertTimeToSystemNative(restorePointTime)
+    load_restore_state(
+        config["DOWNLOAD_DIR"],
+        {"db_name": dbName, "backup_key": backup["Key"], "restore_time": restorePointTime},
     )
+    if restoreState.get("combined_replay_started"):
+        # A combined replay cannot be resumed, start over from the backup
+        logging.info("Previous run failed during the combined log replay, the backup will be loaded again.")
+        restoreState.pop("combined_replay_started")
+        restoreState["backup_loaded"] = False
+        save_restore_state()
+
+    # Parallel backups are always streamed table by table, whatever the restore mode
+    manifestBackup = backup["Key"].endswith(MANIFEST_FILE_NAME)
+    if restoreMode in ("stream", "parallel") or manifestBackup:
+        if backup.get("BinlogFile"):
+            start_log_file, start_log_pos = backup["BinlogFile"], backup["BinlogPosition"]
+        elif manifestBackup:
+            manifest = read_backup_manifest(bucket_name, backup["Key"])
+            start_log_file, start_log_pos = manifest["binlog_file"], manifest["binlog_position"]
+        else:
+            start_log_file, start_log_pos = extract_log_file_and_position_from_s3(
+                bucket_name, backup["Key"]
+            )
+    else:
+        backup_file = downloadBackup(
+            bucket_name, backup["Key"], backupDownloadDir, expected_sha256=backup.get("Sha256")
+        )
+        start_log_file, start_log_pos = extract_log_file_and_position(backup_file)
+
+    # Continue the replay from the last checkpoint mysql acknowledged
+    if restoreState.get("backup_loaded") and restoreState.get("replay_log"):
+        start_log_file, start_log_pos = restoreState["replay_log"], restoreState["replay_position"]
+    downloadLogs(bucket_name, logsPrefix, logDownloadDir, start_log_file)
+    if start_log_pos is None:
+        # The checkpoint log was fully applied, continue with the next one
+        remaining_logs = sorted(
+            (name for name in os.listdir(logDownloadDir)
+             if binlog_sequence(name) > binlog_sequence(start_log_file) and not name.endswith(".index")),
+            key=binlog_sequence,
+        )
+        start_log_file = remaining_logs[0] if remaining_logs else None
+
+    if restoreState.get("backup_loaded"):
+        logging.info(f"Backup {backup['Key']} was already loaded by a previous run, skipping load.")
+    else:
+        if manifestBackup:
+            restore_manifest_backup(
+                bucket_name, backup["Key"], dbName, config["RESTORE_WORKERS"]
+            )
+        elif restoreMode == "parallel":
+            parallel_restore_database(
+                bucket_name,
+                backup["Key"],
+                dbName,
+                os.path.join(backupDownloadDir, "spool"),
+                config["RESTORE_WORKERS"],
+                expected_sha256=backup.get("Sha256"),
+            )
+        elif restoreMode == "stream":
+            stream_restore_database(
+                bucket_name, backup["Key"], dbName, expected_sha256=backup.get("Sha256")
+            )
+        else:
+            restore_database(backup_file, dbName)
+        restoreState["backup_loaded"] = True
+        restoreState.pop("replay_log", None)
+        restoreState.pop("replay_position", None)
+        save_restore_state()
+
+    if start_log_file is None:
+        logging.info("All binary logs were already applied by a previous run.")
+    elif replayMode == "pipe":
+        startLogFilePath = os.path.join(logDownloadDir, start_log_file)
+        apply_binary_logs_pipelined(
+            logDownloadDir,
+            dbName,
+            startLogFilePath,
+            start_log_pos,
+            convertTimeToSystemNative(restorePointTime),
+            on_checkpoint=record_replay_checkpoint,
+        )
+    else:
+        startLogFilePath = os.path.join(logDownloadDir, start_log_file)
+        restoreState["combined_replay_started"] = True
+        save_restore_state()
+        apply_combined_binary_logs(
+            logDownloadDir, dbName, startLogFilePath, start_log_pos, convertTimeToSystemNative(restorePointTime)
+        )
 
+    complete_restore_state()
+    runMetrics["status"] = "completed"
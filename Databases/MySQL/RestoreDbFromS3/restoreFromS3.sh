@@ -19,6 +19,12 @@ print_line() {
 # Ensure the script log directory exists
 mkdir -p "$SCRIPT_LOG_DIR"
 
+# The Python scripts share ../scriptConfig.py, copy it next to them when deploying this folder on its own
+if [[ ! -f "$scriptDir/scriptConfig.py" && ! -f "$scriptDir/../scriptConfig.py" ]]; then
+    print_line "ERROR: scriptConfig.py not found in $scriptDir or its parent directory. Exiting..."
+    exit 1
+fi
+
 print_line "Checking virtual environment..."
 
 if [[ "$PYTHON_ENV" != 'NONE' && "$PYTHON_ENV" != 'none' ]]; then
@@ -34,4 +40,4 @@ if [[ "$PYTHON_ENV" != 'NONE' && "$PYTHON_ENV" != 'none' ]]; then
     source "$PYTHON_ENV/bin/activate"
 fi
 
-python3 restoreFromS3.py
+python3 restoreFromS3.py "$@"
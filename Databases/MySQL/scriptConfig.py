@@ -0,0 +1,91 @@
+import logging
+import os
+
+# Environment variables overriding the variables file are named MYSQL_S3_<KEY>, a bare KEY
+# (e.g. BUCKET_NAME or DB_NAME set for something else) is never picked up
+ENV_PREFIX = "MYSQL_S3_"
+
+
+class ConfigError(ValueError):
+    pass
+
+
+def read_variables_file(var_file):
+    """
+    Parses a KEY=VALUE variables file. Everything after the first '=' is the value, so values may contain '='.
+    Empty lines and lines starting with '#' are skipped.
+    :param var_file: Path of the variables file
+    :return: Dictionary of the raw (string) values
+    """
+    values = {}
+    errors = []
+    with open(var_file, "r") as file:
+        for number, line in enumerate(file, start=1):
+            line = line.strip()
+            if not line or line.startswith("#"):
+                continue
+            key, sep, value = line.partition("=")
+            if not sep or not key.strip():
+                errors.append(f"line {number} is not a KEY=VALUE pair: {line}")
+                continue
+            values[key.strip()] = value.strip()
+    if errors:
+        raise ConfigError(f"Invalid {var_file}: " + "; ".join(errors))
+    return values
+
+
+def load_config(var_file, spec):
+    """
+    Reads the variables file once and returns the variables of the spec, converted and validated.
+    A non-empty environment variable named MYSQL_S3_<KEY> overrides the value of the file, call
+    log_env_overrides once logging is set up to record which ones were used.
+
+    Each spec entry maps a variable name to a dictionary with the optional fields:
+        type: callable converting the string value (int, float, str or a validation function raising ValueError)
+        default: value used when the variable is missing or empty, the variable is required when no default is given
+        choices: allowed values
+        min: minimum allowed value
+    All problems are collected and raised together as a ConfigError, before any work is done.
+    :param var_file: Path of the variables file
+    :param spec: Dictionary of variable name to its spec
+    :return: Dictionary of variable name to its value
+    """
+    values = read_variables_file(var_file)
+    values.update(get_env_overrides(spec))
+    config = {}
+    errors = []
+    for key, option in spec.items():
+        value = values.get(key)
+        if not value:
+            if "default" not in option:
+                errors.append(f"{key} not found in {var_file}")
+            else:
+                config[key] = option["default"]
+            continue
+        try:
+            value = option.get("type", str)(value)
+        except ValueError as e:
+            errors.append(f"{key}={value} is not valid ({e})")
+            continue
+        if "choices" in option and value not in option["choices"]:
+            errors.append(f"{key}={value} is not one of {', '.join(map(str, option['choices']))}")
+        elif "min" in option and value < option["min"]:
+            errors.append(f"{key}={value} must be at least {option['min']}")
+        config[key] = value
+    if errors:
+        raise ConfigError("Invalid configuration: " + "; ".join(errors))
+    return config
+
+
+def get_env_overrides(spec):
+    """
+    :param spec: Dictionary of variable name to its spec
+    :return: Dictionary of variable name to the value of its non-empty MYSQL_S3_<KEY> environment variable
+    """
+    return {key: os.environ[ENV_PREFIX + key] for key in spec if os.environ.get(ENV_PREFIX + key)}
+
+
+def log_env_overrides(spec):
+    """Logs every variable whose value comes from the environment instead of the variables file."""
+    for key, value in get_env_overrides(spec).items():
+        logging.info(f"{key} is overridden by the environment ({ENV_PREFIX}{key}={value})")